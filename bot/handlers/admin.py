@@ -6,13 +6,22 @@ from aiogram.fsm.state import State, StatesGroup
 
 from bot.keyboards.admin_kb import AdminKeyboards
 from bot.keyboards.user_kb import UserKeyboards
+from bot.states import RegistrationStates
+from bot.storage import SQLiteStorage
+from database import Database
 from database.models import UserStatus
 from database.repositories import UserRepository, SettingsRepository
 from services.google_sheets import GoogleSheetsService
+from services.broadcast import BroadcastService
 from config import Config
 
 router = Router()
 
+CONFIRMATION_TEXT = (
+    "👋 <b>Привет!</b>\n\n"
+    "Завтра состоится проект. Подтверждаешь ли ты своё присутствие?"
+)
+
 
 class AdminStates(StatesGroup):
     waiting_for_limit = State()
@@ -21,6 +30,20 @@ class AdminStates(StatesGroup):
     waiting_for_text_message = State()
 
 
+# Шаги регистрации для статистики незавершённых анкет
+REGISTRATION_STEPS = {
+    RegistrationStates.waiting_for_full_name.state: "ФИО",
+    RegistrationStates.waiting_for_study_group.state: "Группа",
+    RegistrationStates.waiting_for_course.state: "Курс",
+    RegistrationStates.waiting_for_vk_link.state: "ВКонтакте",
+    RegistrationStates.waiting_for_tg_link.state: "Telegram",
+    RegistrationStates.waiting_for_phone.state: "Телефон",
+    RegistrationStates.waiting_for_faculty.state: "Факультет",
+    RegistrationStates.waiting_for_source.state: "Источник",
+    RegistrationStates.waiting_for_consent.state: "Согласие",
+}
+
+
 def is_admin(user_id: int, config: Config) -> bool:
     return user_id in config.bot.admin_ids
 
@@ -75,21 +98,31 @@ async def admin_stats(
     callback: CallbackQuery,
     config: Config,
     user_repo: UserRepository,
-    settings_repo: SettingsRepository
+    settings_repo: SettingsRepository,
+    fsm_storage: SQLiteStorage
 ):
     if not is_admin(callback.from_user.id, config):
         await callback.answer("Нет доступа", show_alert=True)
         return
     
     settings = await settings_repo.get()
-    total = await user_repo.get_total_count()
-    registered = len(await user_repo.get_all(UserStatus.REGISTERED))
-    reserve = len(await user_repo.get_all(UserStatus.RESERVE))
-    confirmed = len(await user_repo.get_all(UserStatus.CONFIRMED))
-    declined = len(await user_repo.get_all(UserStatus.DECLINED))
+    counts = await user_repo.count_by_status()
+    state_counts = await fsm_storage.state_counts()
+    total = sum(counts.values())
+    registered = counts[UserStatus.REGISTERED]
+    reserve = counts[UserStatus.RESERVE]
+    confirmed = counts[UserStatus.CONFIRMED]
+    declined = counts[UserStatus.DECLINED]
+    unreachable = await user_repo.get_unreachable_count()
     
     reg_status = "🟢 Открыта" if settings.registration_open else "🔴 Закрыта"
     limit_text = str(settings.max_registrations) if settings.max_registrations > 0 else "Без лимита"
+    filling = sum(state_counts.get(state, 0) for state in REGISTRATION_STEPS)
+    steps_text = "".join(
+        f"   {label}: {state_counts[state]}\n"
+        for state, label in REGISTRATION_STEPS.items()
+        if state_counts.get(state)
+    )
     
     await callback.message.edit_text(
         f"📊 <b>Статистика</b>\n\n"
@@ -99,7 +132,10 @@ async def admin_stats(
         f"✅ Зарегистрировано: {registered}\n"
         f"📋 В резерве: {reserve}\n"
         f"✅ Подтвердили: {confirmed}\n"
-        f"❌ Отказались: {declined}",
+        f"❌ Отказались: {declined}\n\n"
+        f"🚫 Недоступны (пропускаются в рассылках): {unreachable}\n\n"
+        f"⏸ <b>Заполняют анкету сейчас:</b> {filling}\n"
+        f"{steps_text}",
         reply_markup=AdminKeyboards.get_back_button(),
         parse_mode="HTML"
     )
@@ -179,6 +215,7 @@ async def process_limit(
     config: Config,
     settings_repo: SettingsRepository,
     user_repo: UserRepository,
+    db: Database,
     bot: Bot
 ):
     if not is_admin(message.from_user.id, config):
@@ -192,24 +229,26 @@ async def process_limit(
         await message.answer("❌ Введи корректное число (0 или больше)")
         return
     
-    await settings_repo.set_max_registrations(limit)
+    # Limit and statuses change together or not at all
+    demoted = []
+    async with db.transaction():
+        await settings_repo.set_max_registrations(limit)
+        
+        # Update statuses if limit changed
+        if limit > 0:
+            demoted = await user_repo.demote_beyond_limit(limit)
     await state.clear()
     
-    # Update statuses if limit changed
-    if limit > 0:
-        registered_users = await user_repo.get_all(UserStatus.REGISTERED)
-        for i, user in enumerate(registered_users):
-            if i >= limit:
-                await user_repo.update_status(user.id, UserStatus.RESERVE)
-                # Notify user
-                try:
-                    await bot.send_message(
-                        user.telegram_id,
-                        "📋 К сожалению, количество мест ограничено, "
-                        "и ты был перемещён в резерв. Мы сообщим, если появится место!"
-                    )
-                except Exception:
-                    pass
+    for telegram_id in demoted:
+        # Notify user
+        try:
+            await bot.send_message(
+                telegram_id,
+                "📋 К сожалению, количество мест ограничено, "
+                "и ты был перемещён в резерв. Мы сообщим, если появится место!"
+            )
+        except Exception:
+            pass
     
     await message.answer(
         f"✅ Лимит установлен: {limit if limit > 0 else 'Без лимита'}",
@@ -339,12 +378,13 @@ async def admin_promote_reserve(
         await callback.answer("Нет доступа", show_alert=True)
         return
     
-    reserve_users = await user_repo.get_all(UserStatus.RESERVE)
-    declined_count = len(await user_repo.get_all(UserStatus.DECLINED))
-    confirmed_count = len(await user_repo.get_all(UserStatus.CONFIRMED))
-    registered_count = len(await user_repo.get_all(UserStatus.REGISTERED))
+    counts = await user_repo.count_by_status()
+    reserve_count = counts[UserStatus.RESERVE]
+    declined_count = counts[UserStatus.DECLINED]
+    confirmed_count = counts[UserStatus.CONFIRMED]
+    registered_count = counts[UserStatus.REGISTERED]
     
-    if not reserve_users:
+    if not reserve_count:
         await callback.message.edit_text(
             "📋 <b>Резерв пуст</b>\n\n"
             "Нет участников в резерве для добавления.",
@@ -360,9 +400,9 @@ async def admin_promote_reserve(
         f"✅ Подтвердили: {confirmed_count}\n"
         f"❌ Отказались: {declined_count}\n"
         f"⏳ Ждём ответа: {registered_count}\n"
-        f"📋 В резерве: {len(reserve_users)}\n\n"
+        f"📋 В резерве: {reserve_count}\n\n"
         f"<b>Сколько человек добавить из резерва?</b>\n"
-        f"(максимум: {len(reserve_users)})",
+        f"(максимум: {reserve_count})",
         reply_markup=AdminKeyboards.get_cancel_button(),
         parse_mode="HTML"
     )
@@ -386,12 +426,12 @@ async def process_promote_count(
         await message.answer("❌ Введи корректное число (больше 0)")
         return
     
-    reserve_users = await user_repo.get_all(UserStatus.RESERVE)
+    reserve_count = (await user_repo.count_by_status())[UserStatus.RESERVE]
     
-    if count > len(reserve_users):
+    if count > reserve_count:
         await message.answer(
-            f"❌ В резерве только {len(reserve_users)} человек.\n"
-            f"Введи число от 1 до {len(reserve_users)}:"
+            f"❌ В резерве только {reserve_count} человек.\n"
+            f"Введи число от 1 до {reserve_count}:"
         )
         return
     
@@ -420,22 +460,20 @@ async def do_promote_reserve(
         return
     
     count = int(callback.data.split(":")[1])
-    reserve_users = await user_repo.get_all(UserStatus.RESERVE)
-    
-    # Take first N users from reserve (sorted by registration date)
-    users_to_promote = reserve_users[:count]
     
     await callback.message.edit_text("📤 Добавление участников...")
     
+    # First N users from reserve (sorted by registration date)
+    promoted = await user_repo.promote_from_reserve(count)
+    
     success = 0
     failed = 0
     
-    for user in users_to_promote:
-        await user_repo.update_status(user.id, UserStatus.REGISTERED)
+    for telegram_id in promoted:
         # Notify user
         try:
             await bot.send_message(
-                user.telegram_id,
+                telegram_id,
                 "🎉 <b>Отличные новости!</b>\n\n"
                 "Ты переведён из резерва в основной список участников! "
                 "Ждём тебя на проекте!",
@@ -448,7 +486,7 @@ async def do_promote_reserve(
     
     await callback.message.edit_text(
         f"✅ <b>Готово!</b>\n\n"
-        f"Добавлено из резерва: {len(users_to_promote)}\n"
+        f"Добавлено из резерва: {len(promoted)}\n"
         f"Уведомлений отправлено: {success - failed}\n"
         f"Ошибок доставки: {failed}",
         reply_markup=AdminKeyboards.get_back_button(),
@@ -463,6 +501,7 @@ async def process_delete_user(
     config: Config,
     user_repo: UserRepository,
     settings_repo: SettingsRepository,
+    db: Database,
     bot: Bot
 ):
     if not is_admin(message.from_user.id, config):
@@ -474,7 +513,14 @@ async def process_delete_user(
         await message.answer("❌ Введи корректный ID (число)")
         return
     
-    deleted_user = await user_repo.delete(user_id)
+    # The freed seat goes to the first reserve user in the same transaction
+    reserve_user = None
+    async with db.transaction():
+        deleted_user = await user_repo.delete(user_id)
+        if deleted_user and deleted_user.status == UserStatus.REGISTERED:
+            reserve_user = await user_repo.get_first_reserve()
+            if reserve_user:
+                await user_repo.update_status(reserve_user.id, UserStatus.REGISTERED)
     await state.clear()
     
     if not deleted_user:
@@ -485,21 +531,17 @@ async def process_delete_user(
         return
     
 
-    if deleted_user.status == UserStatus.REGISTERED:
-        reserve_user = await user_repo.get_first_reserve()
-        if reserve_user:
-            await user_repo.update_status(reserve_user.id, UserStatus.REGISTERED)
-
-            try:
-                await bot.send_message(
-                    reserve_user.telegram_id,
-                    "🎉 <b>Отличные новости!</b>\n\n"
-                    "Освободилось место, и ты теперь зарегистрирован на проект! "
-                    "Ждём тебя!",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
+    if reserve_user:
+        try:
+            await bot.send_message(
+                reserve_user.telegram_id,
+                "🎉 <b>Отличные новости!</b>\n\n"
+                "Освободилось место, и ты теперь зарегистрирован на проект! "
+                "Ждём тебя!",
+                parse_mode="HTML"
+            )
+        except Exception:
+            pass
     
     await message.answer(
         f"✅ Участник {deleted_user.full_name} удалён.",
@@ -518,12 +560,16 @@ async def admin_broadcast_confirm(
         await callback.answer("Нет доступа", show_alert=True)
         return
     
-    users = await user_repo.get_users_for_confirmation()
+    count = await user_repo.count_users(
+        (UserStatus.REGISTERED, UserStatus.RESERVE),
+        confirmation_sent=False,
+        include_unreachable=False
+    )
     
     await callback.message.edit_text(
         f"📢 <b>Рассылка подтверждения присутствия</b>\n\n"
         f"Будет отправлено сообщение с вопросом о присутствии\n"
-        f"<b>{len(users)} участникам</b>\n\n"
+        f"<b>{count} участникам</b>\n\n"
         f"Подтвердить рассылку?",
         reply_markup=AdminKeyboards.get_confirm_broadcast(),
         parse_mode="HTML"
@@ -535,43 +581,31 @@ async def do_broadcast_confirmation(
     callback: CallbackQuery,
     config: Config,
     user_repo: UserRepository,
-    bot: Bot
+    broadcast_service: BroadcastService
 ):
     if not is_admin(callback.from_user.id, config):
         await callback.answer("Нет доступа", show_alert=True)
         return
     
-    users = await user_repo.get_users_for_confirmation()
+    users = user_repo.iter_recipients(
+        (UserStatus.REGISTERED, UserStatus.RESERVE),
+        confirmation_sent=False
+    )
     
     await callback.message.edit_text(
         "📤 Рассылка начата...",
         parse_mode="HTML"
     )
     
-    success = 0
-    failed = 0
-    
-    for user in users:
-        try:
-            await bot.send_message(
-                user.telegram_id,
-                "👋 <b>Привет!</b>\n\n"
-                "Завтра состоится проект. Подтверждаешь ли ты своё присутствие?",
-                reply_markup=UserKeyboards.get_confirmation_keyboard(),
-                parse_mode="HTML"
-            )
-            await user_repo.update_confirmation_sent(user.id, True)
-            success += 1
-        except Exception:
-            failed += 1
-    
-    await callback.message.edit_text(
-        f"✅ <b>Рассылка завершена</b>\n\n"
-        f"✅ Отправлено: {success}\n"
-        f"❌ Ошибок: {failed}",
-        reply_markup=AdminKeyboards.get_back_button(),
-        parse_mode="HTML"
+    job_id = await broadcast_service.create_job(
+        users,
+        CONFIRMATION_TEXT,
+        reply_markup=UserKeyboards.get_confirmation_keyboard(),
+        mark_confirmation=True,
+        title="Рассылка",
+        status_message=callback.message
     )
+    broadcast_service.spawn(job_id)
 
 
 # Re-broadcast to non-responded users
@@ -586,9 +620,13 @@ async def admin_rebroadcast_confirm(
         return
     
     # Get users who haven't responded (received message but status is still REGISTERED or RESERVE)
-    users = await user_repo.get_users_without_response()
+    count = await user_repo.count_users(
+        (UserStatus.REGISTERED, UserStatus.RESERVE),
+        confirmation_sent=True,
+        include_unreachable=False
+    )
     
-    if not users:
+    if not count:
         await callback.message.edit_text(
             "📢 <b>Повторная рассылка</b>\n\n"
             "Нет участников, которым нужно отправить повторную рассылку.\n"
@@ -600,7 +638,7 @@ async def admin_rebroadcast_confirm(
     
     await callback.message.edit_text(
         f"🔄 <b>Повторная рассылка подтверждения</b>\n\n"
-        f"Будет отправлено сообщение <b>{len(users)} участникам</b>, "
+        f"Будет отправлено сообщение <b>{count} участникам</b>, "
         f"которые получили первую рассылку, но ещё не ответили.\n\n"
         f"⚠️ <b>Внимание:</b> У них может быть несколько активных опросников, "
         f"но ответ засчитается только один раз.\n\n"
@@ -615,46 +653,32 @@ async def do_rebroadcast_confirmation(
     callback: CallbackQuery,
     config: Config,
     user_repo: UserRepository,
-    bot: Bot
+    broadcast_service: BroadcastService
 ):
     if not is_admin(callback.from_user.id, config):
         await callback.answer("Нет доступа", show_alert=True)
         return
     
     # Get users who haven't responded
-    users = await user_repo.get_users_without_response()
+    users = user_repo.iter_recipients(
+        (UserStatus.REGISTERED, UserStatus.RESERVE),
+        confirmation_sent=True
+    )
     
     await callback.message.edit_text(
         "📤 Повторная рассылка начата...",
         parse_mode="HTML"
     )
     
-    success = 0
-    failed = 0
-    
-    for user in users:
-        try:
-            await bot.send_message(
-                user.telegram_id,
-                "👋 <b>Привет!</b>\n\n"
-                "Завтра состоится проект. Подтверждаешь ли ты своё присутствие?",
-                reply_markup=UserKeyboards.get_confirmation_keyboard(),
-                parse_mode="HTML"
-            )
-            # Не сбрасываем confirmation_sent, чтобы знать что отправляли
-            success += 1
-        except Exception:
-            failed += 1
-    
-    await callback.message.edit_text(
-        f"✅ <b>Повторная рассылка завершена</b>\n\n"
-        f"✅ Отправлено: {success}\n"
-        f"❌ Ошибок: {failed}\n\n"
-        f"💡 <b>Важно:</b> Если у пользователя несколько активных опросников, "
-        f"ответ засчитается только один раз.",
-        reply_markup=AdminKeyboards.get_back_button(),
-        parse_mode="HTML"
+    # Не сбрасываем confirmation_sent, чтобы знать что отправляли
+    job_id = await broadcast_service.create_job(
+        users,
+        CONFIRMATION_TEXT,
+        reply_markup=UserKeyboards.get_confirmation_keyboard(),
+        title="Повторная рассылка",
+        status_message=callback.message
     )
+    broadcast_service.spawn(job_id)
 
 
 @router.callback_query(F.data == "admin_confirm_broadcast_all")
@@ -662,59 +686,32 @@ async def do_broadcast_all(
     callback: CallbackQuery,
     config: Config,
     user_repo: UserRepository,
-    bot: Bot
+    broadcast_service: BroadcastService
 ):
     if not is_admin(callback.from_user.id, config):
         await callback.answer("Нет доступа", show_alert=True)
         return
     
-    # Get both new users and non-responded users
-    new_users = await user_repo.get_users_for_confirmation()
-    non_responded = await user_repo.get_users_without_response()
-    
-    # Create set of new user IDs for quick lookup
-    new_user_ids = {user.id for user in new_users}
-    
-    all_users = new_users + non_responded
+    # Both new users and non-responded users
+    all_users = user_repo.iter_recipients(
+        (UserStatus.REGISTERED, UserStatus.RESERVE)
+    )
     
     await callback.message.edit_text(
         "📤 Рассылка начата...",
         parse_mode="HTML"
     )
     
-    success_new = 0
-    success_retry = 0
-    failed = 0
-    
-    for user in all_users:
-        try:
-            await bot.send_message(
-                user.telegram_id,
-                "👋 <b>Привет!</b>\n\n"
-                "Завтра состоится проект. Подтверждаешь ли ты своё присутствие?",
-                reply_markup=UserKeyboards.get_confirmation_keyboard(),
-                parse_mode="HTML"
-            )
-            # Устанавливаем confirmation_sent только для новых
-            if user.id in new_user_ids:
-                await user_repo.update_confirmation_sent(user.id, True)
-                success_new += 1
-            else:
-                success_retry += 1
-        except Exception:
-            failed += 1
-    
-    await callback.message.edit_text(
-        f"✅ <b>Рассылка завершена</b>\n\n"
-        f"🆕 Новым отправлено: {success_new}\n"
-        f"⏳ Не ответили отправлено: {success_retry}\n"
-        f"✅ Всего отправлено: {success_new + success_retry}\n"
-        f"❌ Ошибок: {failed}\n\n"
-        f"💡 <b>Важно:</b> Если у пользователя несколько активных опросников, "
-        f"ответ засчитается только один раз.",
-        reply_markup=AdminKeyboards.get_back_button(),
-        parse_mode="HTML"
+    # Устанавливаем confirmation_sent только для новых
+    job_id = await broadcast_service.create_job(
+        all_users,
+        CONFIRMATION_TEXT,
+        reply_markup=UserKeyboards.get_confirmation_keyboard(),
+        mark_confirmation=True,
+        title="Рассылка всем",
+        status_message=callback.message
     )
+    broadcast_service.spawn(job_id)
 
 
 # Broadcast to all (new + non-responded)
@@ -729,9 +726,17 @@ async def admin_broadcast_all(
         return
     
     # Get both new users and non-responded users
-    new_users = await user_repo.get_users_for_confirmation()
-    non_responded = await user_repo.get_users_without_response()
-    total = len(new_users) + len(non_responded)
+    new_count = await user_repo.count_users(
+        (UserStatus.REGISTERED, UserStatus.RESERVE),
+        confirmation_sent=False,
+        include_unreachable=False
+    )
+    non_responded_count = await user_repo.count_users(
+        (UserStatus.REGISTERED, UserStatus.RESERVE),
+        confirmation_sent=True,
+        include_unreachable=False
+    )
+    total = new_count + non_responded_count
     
     if total == 0:
         await callback.message.edit_text(
@@ -746,8 +751,8 @@ async def admin_broadcast_all(
     await callback.message.edit_text(
         f"📨 <b>Рассылка всем (новым + не ответили)</b>\n\n"
         f"📊 <b>Статистика:</b>\n"
-        f"🆕 Новым (ещё не получали): {len(new_users)}\n"
-        f"⏳ Не ответили (получали, но не ответили): {len(non_responded)}\n"
+        f"🆕 Новым (ещё не получали): {new_count}\n"
+        f"⏳ Не ответили (получали, но не ответили): {non_responded_count}\n"
         f"📤 <b>Всего будет отправлено: {total}</b>\n\n"
         f"⚠️ <b>Внимание:</b> У тех, кто не ответил, может быть несколько активных опросников, "
         f"но ответ засчитается только один раз.\n\n"
@@ -785,12 +790,11 @@ async def admin_export_all(
     await callback.message.edit_text("📤 Экспорт данных...")
     
     try:
-        users = await user_repo.get_all()
-        await sheets_service.export_registrations(users)
+        count = await sheets_service.export_registrations(user_repo.iter_users())
         
         await callback.message.edit_text(
             f"✅ <b>Экспорт завершён</b>\n\n"
-            f"Экспортировано записей: {len(users)}",
+            f"Экспортировано записей: {count}",
             reply_markup=AdminKeyboards.get_back_button(),
             parse_mode="HTML"
         )
@@ -818,15 +822,15 @@ async def admin_export_confirmation(
     await callback.message.edit_text("📤 Экспорт данных...")
     
     try:
-        confirmed = await user_repo.get_confirmed_users()
-        declined = await user_repo.get_declined_users()
-        
-        await sheets_service.export_confirmations(confirmed, declined)
+        confirmed, declined = await sheets_service.export_confirmations(
+            user_repo.iter_users(UserStatus.CONFIRMED),
+            user_repo.iter_users(UserStatus.DECLINED)
+        )
         
         await callback.message.edit_text(
             f"✅ <b>Экспорт завершён</b>\n\n"
-            f"Подтвердили: {len(confirmed)}\n"
-            f"Отказались: {len(declined)}",
+            f"Подтвердили: {confirmed}\n"
+            f"Отказались: {declined}",
             reply_markup=AdminKeyboards.get_back_button(),
             parse_mode="HTML"
         )
@@ -868,22 +872,22 @@ async def text_broadcast_select_recipients(
     
     recipient_type = callback.data.split(":")[1]
     
-    # Get users based on type
+    # Count users based on type
     if recipient_type == "all":
-        users = await user_repo.get_all()
+        count = await user_repo.count_users(include_unreachable=False)
     elif recipient_type == "registered":
-        users = await user_repo.get_all(UserStatus.REGISTERED)
+        count = await user_repo.count_users(UserStatus.REGISTERED, include_unreachable=False)
     elif recipient_type == "reserve":
-        users = await user_repo.get_all(UserStatus.RESERVE)
+        count = await user_repo.count_users(UserStatus.RESERVE, include_unreachable=False)
     elif recipient_type == "confirmed":
-        users = await user_repo.get_all(UserStatus.CONFIRMED)
+        count = await user_repo.count_users(UserStatus.CONFIRMED, include_unreachable=False)
     elif recipient_type == "declined":
-        users = await user_repo.get_all(UserStatus.DECLINED)
+        count = await user_repo.count_users(UserStatus.DECLINED, include_unreachable=False)
     else:
         await callback.answer("Неверный тип получателей", show_alert=True)
         return
     
-    if not users:
+    if not count:
         recipient_names = {
             "all": "участников",
             "registered": "зарегистрированных",
@@ -902,7 +906,7 @@ async def text_broadcast_select_recipients(
     # Save recipient type and count to state
     await state.update_data(
         text_broadcast_type=recipient_type,
-        text_broadcast_count=len(users)
+        text_broadcast_count=count
     )
     
     await state.set_state(AdminStates.waiting_for_text_message)
@@ -917,7 +921,7 @@ async def text_broadcast_select_recipients(
     
     await callback.message.edit_text(
         f"💬 <b>Рассылка текстового сообщения</b>\n\n"
-        f"📊 Получатели: {recipient_names.get(recipient_type, 'участники')} ({len(users)} чел.)\n\n"
+        f"📊 Получатели: {recipient_names.get(recipient_type, 'участники')} ({count} чел.)\n\n"
         f"📝 <b>Введи текст сообщения:</b>\n"
         f"(Поддерживается HTML-разметка)",
         reply_markup=AdminKeyboards.get_cancel_button(),
@@ -976,7 +980,7 @@ async def do_text_broadcast(
     callback: CallbackQuery,
     config: Config,
     user_repo: UserRepository,
-    bot: Bot,
+    broadcast_service: BroadcastService,
     state: FSMContext
 ):
     if not is_admin(callback.from_user.id, config):
@@ -994,15 +998,15 @@ async def do_text_broadcast(
     
     # Get users based on type
     if recipient_type == "all":
-        users = await user_repo.get_all()
+        users = user_repo.iter_recipients()
     elif recipient_type == "registered":
-        users = await user_repo.get_all(UserStatus.REGISTERED)
+        users = user_repo.iter_recipients(UserStatus.REGISTERED)
     elif recipient_type == "reserve":
-        users = await user_repo.get_all(UserStatus.RESERVE)
+        users = user_repo.iter_recipients(UserStatus.RESERVE)
     elif recipient_type == "confirmed":
-        users = await user_repo.get_all(UserStatus.CONFIRMED)
+        users = user_repo.iter_recipients(UserStatus.CONFIRMED)
     elif recipient_type == "declined":
-        users = await user_repo.get_all(UserStatus.DECLINED)
+        users = user_repo.iter_recipients(UserStatus.DECLINED)
     else:
         await callback.answer("Неверный тип получателей", show_alert=True)
         await state.clear()
@@ -1011,20 +1015,6 @@ async def do_text_broadcast(
     await state.clear()
     await callback.message.edit_text("📤 Рассылка начата...")
     
-    success = 0
-    failed = 0
-    
-    for user in users:
-        try:
-            await bot.send_message(
-                user.telegram_id,
-                text_message,
-                parse_mode="HTML"
-            )
-            success += 1
-        except Exception:
-            failed += 1
-    
     recipient_names = {
         "all": "всем участникам",
         "registered": "зарегистрированным",
@@ -1033,12 +1023,11 @@ async def do_text_broadcast(
         "declined": "отказавшимся"
     }
     
-    await callback.message.edit_text(
-        f"✅ <b>Рассылка завершена</b>\n\n"
-        f"📊 Получатели: {recipient_names.get(recipient_type, 'участники')}\n"
-        f"✅ Отправлено: {success}\n"
-        f"❌ Ошибок: {failed}",
-        reply_markup=AdminKeyboards.get_back_button(),
-        parse_mode="HTML"
+    job_id = await broadcast_service.create_job(
+        users,
+        text_message,
+        title=f"Рассылка {recipient_names.get(recipient_type, 'участникам')}",
+        status_message=callback.message
     )
+    broadcast_service.spawn(job_id)
 
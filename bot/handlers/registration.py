@@ -6,7 +6,7 @@ from aiogram.fsm.context import FSMContext
 from bot.keyboards.user_kb import UserKeyboards
 from bot.states.registration import RegistrationStates
 from database.models import UserStatus
-from database.repositories import UserRepository, SettingsRepository
+from database.repositories import UserRepository
 
 router = Router()
 
@@ -246,8 +246,7 @@ async def process_source(message: Message, state: FSMContext):
 async def process_consent(
     message: Message,
     state: FSMContext,
-    user_repo: UserRepository,
-    settings_repo: SettingsRepository
+    user_repo: UserRepository
 ):
     if message.text != "✅ Согласен":
         await message.answer(
@@ -259,23 +258,9 @@ async def process_consent(
     data = await state.get_data()
     await state.clear()
     
-    settings = await settings_repo.get()
-    registered_count = await user_repo.get_registered_count()
-    
-    if settings.max_registrations > 0 and registered_count >= settings.max_registrations:
-        status = UserStatus.RESERVE
-        status_text = "📋 <b>В резерве</b>"
-        extra_message = (
-            "\n\nК сожалению, все места уже заняты, но ты добавлен в резерв. "
-            "Если кто-то откажется, мы тебе сообщим!"
-        )
-    else:
-        status = UserStatus.REGISTERED
-        status_text = "✅ <b>Зарегистрирован</b>"
-        extra_message = ""
-    
     try:
-        user = await user_repo.create(
+        # Решение "основной список или резерв" принимается атомарно вместе с записью
+        user = await user_repo.register_with_capacity(
             telegram_id=message.from_user.id,
             username=message.from_user.username,
             full_name=data["full_name"],
@@ -285,10 +270,19 @@ async def process_consent(
             tg_link=data["tg_link"],
             phone=data["phone"],
             faculty=data["faculty"],
-            source=data["source"],
-            status=status
+            source=data["source"]
         )
         
+        if user.status == UserStatus.RESERVE:
+            status_text = "📋 <b>В резерве</b>"
+            extra_message = (
+                "\n\nК сожалению, все места уже заняты, но ты добавлен в резерв. "
+                "Если кто-то откажется, мы тебе сообщим!"
+            )
+        else:
+            status_text = "✅ <b>Зарегистрирован</b>"
+            extra_message = ""
+        
         await message.answer(
             f"🎉 <b>Ты успешно зарегистрировался!</b>{extra_message}\n\n"
             f"📌 <b>Твои данные:</b>\n"
@@ -34,6 +34,9 @@ async def cmd_start(
 
     existing_user = await user_repo.get_by_telegram_id(message.from_user.id)
     if existing_user:
+        if not existing_user.is_reachable:
+            # Пользователь снова написал боту, значит чат снова доступен для рассылок
+            await user_repo.mark_reachable(existing_user.telegram_id)
         await message.answer(
             f"👋 <b>Привет, {existing_user.full_name}!</b>\n\n"
             f"Ты уже зарегистрирован на проект.\n"
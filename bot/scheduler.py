@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+BUSY_TEXT = "⏳ Сейчас очень много запросов. Попробуй ещё раз через минуту!"
+
+
+@dataclass
+class _ChatSlot:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    waiters: int = 0
+
+
+class UpdateScheduler(BaseMiddleware):
+    """Outer update middleware that bounds how updates are processed.
+
+    Updates of one chat run strictly one after another, in arrival order
+    (asyncio.Lock wakes waiters FIFO). Different chats run in parallel, at
+    most max_concurrency handlers at a time. Once max_pending updates are
+    waiting or running, new ones are answered with BUSY_TEXT and dropped
+    instead of piling up. Register it with setup(), not outer_middleware().
+    """
+
+    def __init__(self, max_concurrency: int = 50, max_pending: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._chats: dict[int, _ChatSlot] = {}
+        self.pending = 0
+        self.shed = 0
+
+    def setup(self, dispatcher: Dispatcher) -> "UpdateScheduler":
+        """Register ahead of the FSM middleware.
+
+        Its state reads go through the read pool and may finish in any
+        order. Taking the chat lock first keeps arrival order, and each
+        update sees the state the previous one left behind.
+        """
+        outer = dispatcher.update.outer_middleware
+        if dispatcher.fsm in outer:
+            outer.unregister(dispatcher.fsm)
+            outer.register(self)
+            outer.register(dispatcher.fsm)
+        else:
+            outer.register(self)
+        return self
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        if self.pending >= self.max_pending:
+            self.shed += 1
+            if self.shed % 100 == 1:
+                logger.warning("Update queue is full (%s), shed %s updates so far", self.pending, self.shed)
+            await self._reject(event)
+            return None
+
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        chat_id: Optional[int] = chat.id if chat else user.id if user else None
+
+        self.pending += 1
+        try:
+            if chat_id is None:
+                async with self._slots:
+                    return await handler(event, data)
+
+            slot = self._chats.get(chat_id)
+            if slot is None:
+                slot = self._chats[chat_id] = _ChatSlot()
+            slot.waiters += 1
+            try:
+                # The chat lock first, so a chat waiting on its own backlog holds no global slot
+                async with slot.lock:
+                    async with self._slots:
+                        return await handler(event, data)
+            finally:
+                slot.waiters -= 1
+                if not slot.waiters:
+                    del self._chats[chat_id]
+        finally:
+            self.pending -= 1
+
+    @staticmethod
+    async def _reject(event: Update) -> None:
+        try:
+            if event.message:
+                await event.message.answer(BUSY_TEXT)
+            elif event.callback_query:
+                await event.callback_query.answer(BUSY_TEXT, show_alert=True)
+        except Exception:
+            pass
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from database.repositories import FSMRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class FSMRecord:
+    chat_id: int
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    touched_at: float = field(default_factory=time.monotonic)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage kept in fsm_states, with a write-behind cache.
+
+    Reads and writes go to an in-memory copy, changed keys are written to
+    the database every flush_interval seconds and on close(). A crash can
+    lose at most the last flush_interval of FSM changes, everything older
+    survives restarts.
+
+    With idle_ttl set, a sweeper drops keys nobody touched for that many
+    seconds from memory, and abandoned flows from the table as well, so
+    neither grows with users who walked away. With shard=(index, count) the
+    table sweep leaves alone rows of chats other processes handle.
+    """
+
+    def __init__(
+        self,
+        fsm_repo: FSMRepository,
+        flush_interval: float = 1.0,
+        idle_ttl: float = 0,
+        sweep_interval: float = 300.0,
+        shard: Optional[tuple[int, int]] = None
+    ):
+        self.fsm_repo = fsm_repo
+        self.flush_interval = flush_interval
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.shard = shard
+        self.key_builder = DefaultKeyBuilder(
+            with_bot_id=True,
+            with_business_connection_id=True,
+            with_destiny=True
+        )
+        self._records: dict[str, FSMRecord] = {}
+        self._dirty: set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._sweep_task: Optional[asyncio.Task] = None
+        # Expired by the running sweep, their rows may not be deleted yet
+        self._expiring: set[str] = set()
+
+    async def _record(self, key: StorageKey) -> tuple[str, FSMRecord]:
+        storage_key = self.key_builder.build(key)
+        record = self._records.get(storage_key)
+        if record is None:
+            row = await self.fsm_repo.get(storage_key)
+            # Someone may have filled it while we were reading
+            record = self._records.get(storage_key)
+            if record is None:
+                if storage_key in self._expiring:
+                    row = None
+                record = FSMRecord(key.chat_id, *row) if row else FSMRecord(key.chat_id)
+                self._records[storage_key] = record
+        record.touched_at = time.monotonic()
+        if self.idle_ttl > 0 and self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+        return storage_key, record
+
+    def _mark_dirty(self, storage_key: str) -> None:
+        self._dirty.add(storage_key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key, record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(storage_key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        _, record = await self._record(key)
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key, record = await self._record(key)
+        record.data = data.copy()
+        self._mark_dirty(storage_key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, record = await self._record(key)
+        return record.data.copy()
+
+    async def _flush_loop(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush FSM states, will retry")
+
+    async def flush(self) -> None:
+        """Write changed keys to the database"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        saved = []
+        deleted = []
+        for storage_key in dirty:
+            record = self._records.get(storage_key)
+            if record is None or (record.state is None and not record.data):
+                deleted.append(storage_key)
+            else:
+                saved.append((storage_key, record.chat_id, record.state, record.data.copy()))
+        try:
+            await self.fsm_repo.save_many(saved)
+            await self.fsm_repo.delete_many(deleted)
+        except BaseException:
+            # Keys changed meanwhile are in the new set already, the rest goes back
+            self._dirty |= dirty
+            raise
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Failed to sweep FSM states")
+
+    async def sweep(self) -> int:
+        """Expire keys idle for longer than idle_ttl, returns how many flows were dropped"""
+        deadline = time.monotonic() - self.idle_ttl
+        for storage_key in [
+            key for key, record in self._records.items() if record.touched_at < deadline
+        ]:
+            record = self._records.pop(storage_key)
+            if record.state is not None or record.data:
+                self._expiring.add(storage_key)
+        expired = len(self._expiring)
+        try:
+            await self.fsm_repo.delete_many(list(self._expiring))
+            # Also catches rows of users who haven't come back since a restart
+            for storage_key in await self.fsm_repo.delete_idle(self.idle_ttl, self.shard):
+                record = self._records.get(storage_key)
+                if record is None:
+                    expired += 1
+                elif record.state is not None or record.data:
+                    # Read often but not written lately, it is still in use
+                    self._mark_dirty(storage_key)
+        finally:
+            self._expiring.clear()
+        logger.info("FSM sweep: %s flows expired, %s keys in memory", expired, len(self._records))
+        return expired
+
+    async def state_counts(self) -> dict[str, int]:
+        """Number of keys in every state, unwritten changes included"""
+        await self.flush()
+        return await self.fsm_repo.count_by_state()
+
+    @property
+    def cached_keys(self) -> int:
+        return len(self._records)
+
+    async def close(self) -> None:
+        for task in (self._flush_task, self._sweep_task):
+            if task and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
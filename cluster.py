@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+# Workers import the bot from scratch instead of inheriting the front's loop and routers
+_context = multiprocessing.get_context("spawn")
+
+
+class ShardRouter(BaseMiddleware):
+    """Front process middleware: hands every update to the worker owning its chat.
+
+    A chat always lands on the same worker, so its updates stay ordered and
+    its FSM state is only ever cached by one process. For the dispatcher of
+    the front an update is handled once it is queued, so in webhook mode
+    that's when Telegram gets its answer: updates still waiting in a queue
+    or running in a worker when it stops or dies are not delivered again.
+    """
+
+    def __init__(self, queues: list[Queue]):
+        self.queues = queues
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        chat_id = chat.id if chat else user.id if user else 0
+        self.queues[chat_id % len(self.queues)].put(
+            event.model_dump_json(exclude_unset=True)
+        )
+        # Handlers run in the worker, not here
+        return None
+
+
+def _start_worker(target: Callable[[int, Queue], None], index: int, queue: Queue) -> BaseProcess:
+    process = _context.Process(target=target, args=(index, queue), name=f"bot-worker-{index}")
+    process.start()
+    return process
+
+
+def start_workers(count: int, target: Callable[[int, Queue], None]) -> tuple[list[BaseProcess], list[Queue]]:
+    queues = [_context.Queue() for _ in range(count)]
+    processes = [_start_worker(target, index, queue) for index, queue in enumerate(queues)]
+    logger.info("Started %s worker processes", count)
+    return processes, queues
+
+
+async def watch_workers(
+    processes: list[BaseProcess],
+    queues: list[Queue],
+    target: Callable[[int, Queue], None],
+    interval: float = 1.0,
+    min_uptime: float = 30.0
+) -> None:
+    """Restart worker processes that died, in place in both lists.
+
+    Returns when a worker dies sooner than min_uptime after its start: it
+    can't start at all, so the front has to stop and let the service
+    supervisor take over.
+    """
+    started = [time.monotonic()] * len(processes)
+    while True:
+        await asyncio.sleep(interval)
+        for index, process in enumerate(processes):
+            if process.is_alive():
+                continue
+            logger.error("%s exited with code %s", process.name, process.exitcode)
+            if time.monotonic() - started[index] < min_uptime:
+                logger.error("%s keeps failing", process.name)
+                return
+            # A queue its reader died on may be corrupted, what was left there is lost
+            queues[index].cancel_join_thread()
+            queues[index].close()
+            queues[index] = _context.Queue()
+            processes[index] = _start_worker(target, index, queues[index])
+            started[index] = time.monotonic()
+            logger.info("Restarted %s", process.name)
+
+
+async def stop_workers(processes: list[BaseProcess], queues: list[Queue], timeout: float = 30.0) -> None:
+    """Let workers finish what they got, then wait for them to exit"""
+    for queue in queues:
+        queue.put(None)
+    loop = asyncio.get_running_loop()
+    for process in processes:
+        await loop.run_in_executor(None, process.join, timeout)
+        if process.is_alive():
+            logger.warning("%s didn't stop in %ss, terminating", process.name, timeout)
+            process.terminate()
+
+
+async def consume_updates(queue: Queue, bot: Bot, dp: Dispatcher) -> None:
+    """Worker loop: feed updates from the front process until it sends None"""
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+    while True:
+        payload = await loop.run_in_executor(None, queue.get)
+        if payload is None:
+            break
+        update = Update.model_validate_json(payload, context={"bot": bot})
+        task = asyncio.create_task(_feed(dp, bot, update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _feed(dp: Dispatcher, bot: Bot, update: Update) -> None:
+    try:
+        await dp.feed_update(bot, update)
+    except Exception:
+        logger.exception("Failed to process update id=%s", update.update_id)
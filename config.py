@@ -14,6 +14,28 @@ class BotConfig:
 @dataclass
 class DatabaseConfig:
     path: str = "data/bot.db"
+    group_commit: bool = True
+    commit_window: float = 0.005
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -20000  # negative means KiB, ~20 MB of page cache
+    mmap_size: int = 268435456
+    temp_store: str = "MEMORY"
+    busy_timeout: int = 5000
+    read_pool_size: int = 4
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 300.0
+    
+    @property
+    def pragmas(self) -> dict[str, str | int]:
+        return {
+            "busy_timeout": self.busy_timeout,
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "cache_size": self.cache_size,
+            "mmap_size": self.mmap_size,
+            "temp_store": self.temp_store,
+        }
 
 
 @dataclass
@@ -22,11 +44,58 @@ class GoogleSheetsConfig:
     spreadsheet_id: str
 
 
+@dataclass
+class BroadcastConfig:
+    workers: int = 10
+    rate: float = 25.0
+    per_chat_interval: float = 1.0
+    max_retries: int = 5
+    retry_backoff: float = 1.0
+    retry_backoff_max: float = 30.0
+    progress_interval: float = 5.0
+    flush_size: int = 50
+
+
+@dataclass
+class FSMConfig:
+    flush_interval: float = 1.0
+    idle_ttl: float = 86400.0  # 0 keeps abandoned flows forever
+    sweep_interval: float = 300.0
+
+
+@dataclass
+class UpdatesConfig:
+    max_concurrency: int = 50  # handlers running at once, across all chats
+    max_pending: int = 1000  # waiting + running, newer updates get a "try again" reply
+
+
+@dataclass
+class WebhookConfig:
+    enabled: bool = False  # BOT_MODE=webhook, long polling otherwise
+    url: str = ""  # public base URL the reverse proxy serves, e.g. https://bot.example.com
+    path: str = "/webhook"
+    secret: str = ""
+    host: str = "0.0.0.0"
+    port: int = 8080
+
+
+@dataclass
+class ClusterConfig:
+    workers: int = 0  # more than 1 runs a front process plus that many worker processes
+    worker_cache_ttl: float = 5.0
+    broadcast_poll_interval: float = 1.0  # how soon worker 0 picks up jobs created by others
+
+
 @dataclass
 class Config:
     bot: BotConfig
     db: DatabaseConfig
     google_sheets: GoogleSheetsConfig
+    broadcast: BroadcastConfig
+    fsm: FSMConfig
+    webhook: WebhookConfig
+    updates: UpdatesConfig
+    cluster: ClusterConfig
 
 
 def load_config() -> Config:
@@ -39,11 +108,54 @@ def load_config() -> Config:
             admin_ids=admin_ids
         ),
         db=DatabaseConfig(
-            path=os.getenv("DATABASE_PATH", "data/bot.db")
+            path=os.getenv("DATABASE_PATH", "data/bot.db"),
+            group_commit=os.getenv("DATABASE_GROUP_COMMIT", "1") == "1",
+            commit_window=float(os.getenv("DATABASE_COMMIT_WINDOW_MS", "5")) / 1000,
+            journal_mode=os.getenv("DATABASE_JOURNAL_MODE", "WAL"),
+            synchronous=os.getenv("DATABASE_SYNCHRONOUS", "NORMAL"),
+            cache_size=int(os.getenv("DATABASE_CACHE_SIZE", "-20000")),
+            mmap_size=int(os.getenv("DATABASE_MMAP_SIZE", "268435456")),
+            temp_store=os.getenv("DATABASE_TEMP_STORE", "MEMORY"),
+            busy_timeout=int(os.getenv("DATABASE_BUSY_TIMEOUT_MS", "5000")),
+            read_pool_size=int(os.getenv("DATABASE_READ_POOL_SIZE", "4")),
+            user_cache_size=int(os.getenv("DATABASE_USER_CACHE_SIZE", "10000")),
+            user_cache_ttl=float(os.getenv("DATABASE_USER_CACHE_TTL", "300"))
         ),
         google_sheets=GoogleSheetsConfig(
             credentials_file=os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json"),
             spreadsheet_id=os.getenv("GOOGLE_SPREADSHEET_ID", "")
+        ),
+        broadcast=BroadcastConfig(
+            workers=int(os.getenv("BROADCAST_WORKERS", "10")),
+            rate=float(os.getenv("BROADCAST_RATE", "25")),
+            per_chat_interval=float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1")),
+            max_retries=int(os.getenv("BROADCAST_MAX_RETRIES", "5")),
+            retry_backoff=float(os.getenv("BROADCAST_RETRY_BACKOFF", "1")),
+            retry_backoff_max=float(os.getenv("BROADCAST_RETRY_BACKOFF_MAX", "30")),
+            progress_interval=float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5")),
+            flush_size=int(os.getenv("BROADCAST_FLUSH_SIZE", "50"))
+        ),
+        fsm=FSMConfig(
+            flush_interval=float(os.getenv("FSM_FLUSH_INTERVAL", "1")),
+            idle_ttl=float(os.getenv("FSM_IDLE_TTL_HOURS", "24")) * 3600,
+            sweep_interval=float(os.getenv("FSM_SWEEP_INTERVAL", "300"))
+        ),
+        webhook=WebhookConfig(
+            enabled=os.getenv("BOT_MODE", "polling") == "webhook",
+            url=os.getenv("WEBHOOK_URL", "").rstrip("/"),
+            path=os.getenv("WEBHOOK_PATH", "/webhook"),
+            secret=os.getenv("WEBHOOK_SECRET", ""),
+            host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+            port=int(os.getenv("WEBHOOK_PORT", "8080"))
+        ),
+        updates=UpdatesConfig(
+            max_concurrency=int(os.getenv("UPDATES_MAX_CONCURRENCY", "50")),
+            max_pending=int(os.getenv("UPDATES_MAX_PENDING", "1000"))
+        ),
+        cluster=ClusterConfig(
+            workers=int(os.getenv("BOT_WORKERS", "0")),
+            worker_cache_ttl=float(os.getenv("BOT_WORKER_CACHE_TTL", "5")),
+            broadcast_poll_interval=float(os.getenv("BOT_BROADCAST_POLL_INTERVAL", "1"))
         )
     )
 
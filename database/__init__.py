@@ -1,5 +1,4 @@
 from .database import Database
-from .models import User, BotSettings
-
-__all__ = ["Database", "User", "BotSettings"]
+from .models import User, Recipient, BotSettings, BroadcastJob, BroadcastDelivery, BroadcastStats
 
+__all__ = ["Database", "User", "Recipient", "BotSettings", "BroadcastJob", "BroadcastDelivery", "BroadcastStats"]
@@ -1,19 +1,63 @@
+import asyncio
+import logging
+import re
 import aiosqlite
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+from .migrations import migrate
+
+logger = logging.getLogger(__name__)
 
 
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        group_commit: bool = False,
+        commit_window: float = 0.005,
+        pragmas: dict[str, str | int] | None = None,
+        read_pool_size: int = 0
+    ):
         self.db_path = db_path
+        self.pragmas = pragmas or {}
+        self.group_commit = group_commit
+        self.commit_window = commit_window
+        self.read_pool_size = read_pool_size
         self._connection: aiosqlite.Connection | None = None
+        self._pending_commit: asyncio.Future | None = None
+        self._commit_task: asyncio.Task | None = None
+        self._readers: list[aiosqlite.Connection] = []
+        self._idle_readers: asyncio.Queue[aiosqlite.Connection] | None = None
+        # Held by an open transaction, and briefly by every other write so it
+        # can't land in the middle of someone else's transaction
+        self._write_lock = asyncio.Lock()
+        self._in_transaction: ContextVar[bool] = ContextVar("in_transaction", default=False)
+        self._transaction_listeners: list[Callable[[], None]] = []
     
     async def connect(self) -> None:
         
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         self._connection = await aiosqlite.connect(self.db_path)
-        await self._create_tables()
+        effective = await self._apply_pragmas(self._connection, self.pragmas)
+        if effective:
+            logger.info(
+                "SQLite settings: %s",
+                ", ".join(f"{name}={value}" for name, value in effective.items())
+            )
+        version = await migrate(self._connection)
+        logger.info("Database schema version %s", version)
+        await self._open_readers()
     
     async def disconnect(self) -> None:
+        if self._commit_task:
+            await asyncio.gather(self._commit_task, return_exceptions=True)
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._idle_readers = None
         if self._connection:
             await self._connection.close()
     
@@ -23,33 +67,172 @@ class Database:
             raise RuntimeError("Database not connected")
         return self._connection
     
-    async def _create_tables(self) -> None:
-        await self.connection.executescript("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER UNIQUE NOT NULL,
-                username TEXT,
-                full_name TEXT NOT NULL,
-                study_group TEXT NOT NULL,
-                course INTEGER NOT NULL,
-                vk_link TEXT NOT NULL,
-                tg_link TEXT NOT NULL,
-                phone TEXT NOT NULL,
-                faculty TEXT NOT NULL,
-                source TEXT NOT NULL,
-                status TEXT NOT NULL DEFAULT 'registered',
-                created_at TEXT NOT NULL,
-                confirmation_sent INTEGER NOT NULL DEFAULT 0
-            );
-            
-            CREATE TABLE IF NOT EXISTS bot_settings (
-                id INTEGER PRIMARY KEY CHECK (id = 1),
-                registration_open INTEGER NOT NULL DEFAULT 1,
-                max_registrations INTEGER NOT NULL DEFAULT 0
-            );
-            
-            INSERT OR IGNORE INTO bot_settings (id, registration_open, max_registrations)
-            VALUES (1, 1, 0);
-        """)
-        await self.connection.commit()
+    @property
+    def in_transaction(self) -> bool:
+        return self._in_transaction.get()
+    
+    async def execute(self, sql: str, parameters: Iterable = ()) -> aiosqlite.Cursor:
+        """Run a statement on the writer connection"""
+        if self.in_transaction:
+            return await self.connection.execute(sql, parameters)
+        async with self._write_lock:
+            try:
+                return await self.connection.execute(sql, parameters)
+            except Exception:
+                await self._release_failed_write()
+                raise
+    
+    async def executemany(self, sql: str, parameters: Iterable[Iterable]) -> aiosqlite.Cursor:
+        if self.in_transaction:
+            return await self.connection.executemany(sql, parameters)
+        async with self._write_lock:
+            try:
+                return await self.connection.executemany(sql, parameters)
+            except Exception:
+                await self._release_failed_write()
+                raise
+    
+    async def _release_failed_write(self) -> None:
+        # SQLite has undone the failed statement, but the implicit transaction
+        # it opened keeps the file locked for other connections and processes
+        if self.connection.in_transaction:
+            await self.connection.commit()
+    
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """Run the body as one transaction with a single commit.
+
+        Repository writes inside it join the transaction: their commit()
+        becomes a no-op and everything is rolled back if the body raises.
+        Nested transaction() blocks join the outer one. Writes from other
+        tasks wait until it is finished.
+        """
+        if self.in_transaction:
+            yield
+            return
+        async with self._write_lock:
+            token = self._in_transaction.set(True)
+            try:
+                # Writes of other tasks still waiting for their group commit aren't ours to roll back
+                await self.connection.commit()
+                # Take the write lock up front, another process may hold it
+                await self.connection.execute("BEGIN IMMEDIATE")
+                yield
+            except BaseException:
+                await self.connection.rollback()
+                raise
+            else:
+                await self.connection.commit()
+            finally:
+                self._in_transaction.reset(token)
+                for listener in self._transaction_listeners:
+                    listener()
+    
+    def add_transaction_listener(self, listener: Callable[[], None]) -> None:
+        """Called when a transaction() ends either way.
 
+        Caches use it to drop what they saw while it was open: values written
+        inside a rolled back transaction, or rows other tasks read from the
+        pool before it committed.
+        """
+        self._transaction_listeners.append(listener)
+    
+    async def commit(self) -> None:
+        """Commit writes made so far, returns once they are durable.
+
+        In group commit mode callers arriving within commit_window share one
+        COMMIT, so a burst of writes costs one fsync instead of one per write.
+        Inside transaction() this does nothing, the transaction commits at its end.
+        """
+        if self.in_transaction:
+            return
+        if not self.group_commit:
+            async with self._write_lock:
+                await self.connection.commit()
+            return
+        if self._pending_commit is None:
+            self._pending_commit = asyncio.get_running_loop().create_future()
+            self._commit_task = asyncio.create_task(self._commit_group(self._pending_commit))
+        # A cancelled caller must not cancel the commit other callers wait for
+        await asyncio.shield(self._pending_commit)
+    
+    async def _commit_group(self, done: asyncio.Future) -> None:
+        await asyncio.sleep(self.commit_window)
+        # Writers arriving from now on wait for the next group
+        self._pending_commit = None
+        try:
+            async with self._write_lock:
+                await self.connection.commit()
+        except Exception as e:
+            done.set_exception(e)
+        else:
+            done.set_result(None)
+    
+    async def _apply_pragmas(
+        self,
+        connection: aiosqlite.Connection,
+        pragmas: dict[str, str | int]
+    ) -> dict[str, str | int]:
+        effective = {}
+        for name, value in pragmas.items():
+            # Pragmas can't be parameterized, so only plain names and numbers get through
+            if not re.fullmatch(r"[a-z_]+", name) or not re.fullmatch(r"-?\w+", str(value)):
+                raise ValueError(f"Invalid pragma {name}={value!r}")
+            await connection.execute(f"PRAGMA {name} = {value}")
+            cursor = await connection.execute(f"PRAGMA {name}")
+            row = await cursor.fetchone()
+            effective[name] = row[0] if row else None
+        return effective
+    
+    async def _open_readers(self) -> None:
+        if self.read_pool_size <= 0:
+            return
+        cursor = await self.connection.execute("PRAGMA journal_mode")
+        row = await cursor.fetchone()
+        if not row or row[0].lower() != "wal":
+            # Without WAL readers and the writer lock each other out
+            logger.warning("Read pool needs journal_mode=WAL, reads stay on the writer")
+            return
+        # Journal settings belong to the writer, the rest is per connection
+        pragmas = {
+            name: value for name, value in self.pragmas.items()
+            if name not in ("journal_mode", "synchronous")
+        }
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        self._idle_readers = asyncio.Queue()
+        for _ in range(self.read_pool_size):
+            reader = await aiosqlite.connect(uri, uri=True)
+            await self._apply_pragmas(reader, pragmas)
+            self._readers.append(reader)
+            self._idle_readers.put_nowait(reader)
+        logger.info("Read pool: %s connections", len(self._readers))
+    
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection, or the writer when there is no pool.
+
+        Readers see only committed data, which is all the repositories need
+        since their writes return after commit. Inside transaction() the
+        writer is used.
+        """
+        if self._idle_readers is None or self.in_transaction:
+            # Inside a transaction reads must see its uncommitted writes
+            yield self.connection
+            return
+        reader = await self._idle_readers.get()
+        try:
+            yield reader
+        finally:
+            self._idle_readers.put_nowait(reader)
+    
+    async def fetchone(self, sql: str, parameters: Iterable = ()) -> Optional[tuple]:
+        async with self.reader() as connection:
+            cursor = await connection.execute(sql, parameters)
+            row = await cursor.fetchone()
+            await cursor.close()
+            return row
+    
+    async def fetchall(self, sql: str, parameters: Iterable = ()) -> list[tuple]:
+        async with self.reader() as connection:
+            cursor = await connection.execute(sql, parameters)
+            return list(await cursor.fetchall())
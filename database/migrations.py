@@ -0,0 +1,193 @@
+import logging
+import sqlite3
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    sql: Optional[str] = None
+    apply: Optional[Callable[[aiosqlite.Connection], Awaitable[None]]] = None
+
+
+async def _add_reachability_columns(connection: aiosqlite.Connection) -> None:
+    # Files that ran the bot before versioned migrations may already have them
+    cursor = await connection.execute("PRAGMA table_info(users)")
+    existing = {row[1] for row in await cursor.fetchall()}
+    if "is_reachable" not in existing:
+        await connection.execute(
+            "ALTER TABLE users ADD COLUMN is_reachable INTEGER NOT NULL DEFAULT 1"
+        )
+    if "last_delivery_error_at" not in existing:
+        await connection.execute(
+            "ALTER TABLE users ADD COLUMN last_delivery_error_at TEXT"
+        )
+
+
+# Append only: released versions must never change, a fix is a new migration
+MIGRATIONS = [
+    Migration(1, "initial schema", sql="""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            full_name TEXT NOT NULL,
+            study_group TEXT NOT NULL,
+            course INTEGER NOT NULL,
+            vk_link TEXT NOT NULL,
+            tg_link TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            faculty TEXT NOT NULL,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'registered',
+            created_at TEXT NOT NULL,
+            confirmation_sent INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS bot_settings (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            registration_open INTEGER NOT NULL DEFAULT 1,
+            max_registrations INTEGER NOT NULL DEFAULT 0
+        );
+
+        INSERT OR IGNORE INTO bot_settings (id, registration_open, max_registrations)
+        VALUES (1, 1, 0);
+    """),
+    Migration(2, "broadcast jobs", sql="""
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            reply_markup TEXT,
+            title TEXT NOT NULL DEFAULT 'Рассылка',
+            status_chat_id INTEGER,
+            status_message_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'running',
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL REFERENCES broadcast_jobs (id),
+            user_id INTEGER NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            mark_confirmation INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at TEXT,
+            UNIQUE (job_id, user_id)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_job_status
+            ON broadcast_deliveries (job_id, status);
+    """),
+    Migration(3, "user reachability", apply=_add_reachability_columns),
+    Migration(4, "indexes for status queries", sql="""
+        CREATE INDEX IF NOT EXISTS idx_users_status_created
+            ON users (status, created_at);
+
+        CREATE INDEX IF NOT EXISTS idx_users_status_confirmation_created
+            ON users (status, confirmation_sent, created_at);
+    """),
+    Migration(5, "status counters", sql="""
+        CREATE TABLE IF NOT EXISTS status_counters (
+            status TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        );
+
+        INSERT OR REPLACE INTO status_counters (status, count)
+        SELECT status, COUNT(*) FROM users GROUP BY status;
+
+        INSERT OR IGNORE INTO status_counters (status, count)
+        VALUES ('registered', 0), ('reserve', 0), ('confirmed', 0), ('declined', 0);
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_count_insert
+        AFTER INSERT ON users
+        BEGIN
+            INSERT INTO status_counters (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET count = count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_count_delete
+        AFTER DELETE ON users
+        BEGIN
+            UPDATE status_counters SET count = count - 1 WHERE status = OLD.status;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_count_update
+        AFTER UPDATE OF status ON users
+        WHEN OLD.status <> NEW.status
+        BEGIN
+            UPDATE status_counters SET count = count - 1 WHERE status = OLD.status;
+            INSERT INTO status_counters (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET count = count + 1;
+        END;
+    """),
+    Migration(6, "fsm storage", sql="""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at TEXT NOT NULL
+        );
+    """),
+    Migration(7, "fsm state chat", sql="""
+        ALTER TABLE fsm_states ADD COLUMN chat_id INTEGER;
+    """),
+]
+
+
+async def get_version(connection: aiosqlite.Connection) -> int:
+    cursor = await connection.execute("PRAGMA user_version")
+    row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def migrate(connection: aiosqlite.Connection) -> int:
+    """Bring the schema up to the latest version, returns the resulting version.
+
+    Every migration runs in its own transaction together with the
+    user_version bump, so a failed one leaves the file at the previous version.
+    """
+    await connection.commit()
+    version = await get_version(connection)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        logger.info("Applying migration %s: %s", migration.version, migration.description)
+        try:
+            await connection.execute("BEGIN IMMEDIATE")
+            if migration.sql:
+                # executescript() would commit first, so statements go one by one
+                for statement in _split_statements(migration.sql):
+                    await connection.execute(statement)
+            if migration.apply:
+                await migration.apply(connection)
+            await connection.execute(f"PRAGMA user_version = {migration.version}")
+            await connection.commit()
+        except Exception:
+            await connection.rollback()
+            raise
+        version = migration.version
+    return version
+
+
+def _split_statements(sql: str) -> list[str]:
+    statements = []
+    buffer = ""
+    for line in sql.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
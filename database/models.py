@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional
+from typing import NamedTuple, Optional
 from enum import Enum
 
 
@@ -11,8 +11,9 @@ class UserStatus(Enum):
     DECLINED = "declined"
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
+    """Row of users; status and dates are kept as stored and decoded on access"""
     id: int
     telegram_id: int
     username: Optional[str]
@@ -24,31 +25,42 @@ class User:
     phone: str
     faculty: str
     source: str
-    status: UserStatus
-    created_at: datetime
+    status_value: str = field(repr=False)
+    created_at_value: str = field(repr=False)
     confirmation_sent: bool = False
+    is_reachable: bool = True
+    last_delivery_error_value: Optional[str] = field(default=None, repr=False)
+    
+    @property
+    def status(self) -> UserStatus:
+        return UserStatus(self.status_value)
     
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromisoformat(self.created_at_value)
+    
+    @property
+    def last_delivery_error_at(self) -> Optional[datetime]:
+        if not self.last_delivery_error_value:
+            return None
+        return datetime.fromisoformat(self.last_delivery_error_value)
     
     @classmethod
     def from_row(cls, row: tuple) -> "User":
         return cls(
-            id=row[0],
-            telegram_id=row[1],
-            username=row[2],
-            full_name=row[3],
-            study_group=row[4],
-            course=row[5],
-            vk_link=row[6],
-            tg_link=row[7],
-            phone=row[8],
-            faculty=row[9],
-            source=row[10],
-            status=UserStatus(row[11]),
-            created_at=datetime.fromisoformat(row[12]),
-            confirmation_sent=bool(row[13])
+            row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7],
+            row[8], row[9], row[10], row[11], row[12],
+            bool(row[13]), bool(row[14]), row[15]
         )
 
 
+class Recipient(NamedTuple):
+    """Just the columns a broadcast needs, see UserRepository.iter_recipients"""
+    id: int
+    telegram_id: int
+    confirmation_sent: bool
+
+
 @dataclass
 class BotSettings:
     registration_open: bool = True
@@ -61,3 +73,74 @@ class BotSettings:
             max_registrations=row[1]
         )
 
+
+
+class BroadcastJobStatus(Enum):
+    PREPARING = "preparing"
+    RUNNING = "running"
+    DONE = "done"
+
+
+class DeliveryStatus(Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+@dataclass
+class BroadcastJob:
+    id: int
+    text: str
+    reply_markup: Optional[str]
+    title: str
+    status_chat_id: Optional[int]
+    status_message_id: Optional[int]
+    status: BroadcastJobStatus
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    
+    @classmethod
+    def from_row(cls, row: tuple) -> "BroadcastJob":
+        return cls(
+            id=row[0],
+            text=row[1],
+            reply_markup=row[2],
+            title=row[3],
+            status_chat_id=row[4],
+            status_message_id=row[5],
+            status=BroadcastJobStatus(row[6]),
+            created_at=datetime.fromisoformat(row[7]),
+            finished_at=datetime.fromisoformat(row[8]) if row[8] else None
+        )
+
+
+@dataclass
+class BroadcastDelivery:
+    id: int
+    job_id: int
+    user_id: int
+    telegram_id: int
+    mark_confirmation: bool = False
+    
+    @classmethod
+    def from_row(cls, row: tuple) -> "BroadcastDelivery":
+        return cls(
+            id=row[0],
+            job_id=row[1],
+            user_id=row[2],
+            telegram_id=row[3],
+            mark_confirmation=bool(row[4])
+        )
+
+
+@dataclass
+class BroadcastStats:
+    sent: int = 0
+    failed: int = 0
+    pending: int = 0
+    sent_new: int = 0  # sent to users whose confirmation_sent got set by this job
+    
+    @property
+    def total(self) -> int:
+        return self.sent + self.failed + self.pending
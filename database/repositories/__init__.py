@@ -1,5 +1,6 @@
 from .user_repo import UserRepository
 from .settings_repo import SettingsRepository
+from .broadcast_repo import BroadcastRepository
+from .fsm_repo import FSMRepository
 
-__all__ = ["UserRepository", "SettingsRepository"]
-
+__all__ = ["UserRepository", "SettingsRepository", "BroadcastRepository", "FSMRepository"]
@@ -0,0 +1,198 @@
+from datetime import datetime
+from typing import Optional
+from database.database import Database
+from database.models import (
+    BroadcastJob,
+    BroadcastJobStatus,
+    BroadcastDelivery,
+    BroadcastStats,
+    DeliveryStatus,
+)
+
+
+class BroadcastRepository:
+    def __init__(self, db: Database):
+        self.db = db
+    
+    async def create_job(
+        self,
+        text: str,
+        reply_markup: Optional[str],
+        title: str,
+        status_chat_id: Optional[int] = None,
+        status_message_id: Optional[int] = None
+    ) -> int:
+        """Create a job in PREPARING state, it isn't resumed until start_job"""
+        cursor = await self.db.execute(
+            """
+            INSERT INTO broadcast_jobs (
+                text, reply_markup, title, status_chat_id, status_message_id,
+                status, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                text, reply_markup, title, status_chat_id, status_message_id,
+                BroadcastJobStatus.PREPARING.value, datetime.now().isoformat()
+            )
+        )
+        await self.db.commit()
+        return cursor.lastrowid
+    
+    async def add_deliveries(self, job_id: int, recipients: list[tuple[int, int, bool]]) -> None:
+        """Add one pending delivery per (user_id, telegram_id, mark_confirmation)"""
+        await self.db.executemany(
+            """
+            INSERT OR IGNORE INTO broadcast_deliveries (job_id, user_id, telegram_id, mark_confirmation)
+            VALUES (?, ?, ?, ?)
+            """,
+            [
+                (job_id, user_id, telegram_id, int(mark_confirmation))
+                for user_id, telegram_id, mark_confirmation in recipients
+            ]
+        )
+        await self.db.commit()
+    
+    async def start_job(self, job_id: int) -> None:
+        await self.db.execute(
+            "UPDATE broadcast_jobs SET status = ? WHERE id = ?",
+            (BroadcastJobStatus.RUNNING.value, job_id)
+        )
+        await self.db.commit()
+    
+    async def get_job(self, job_id: int) -> Optional[BroadcastJob]:
+        row = await self.db.fetchone(
+            """
+            SELECT id, text, reply_markup, title, status_chat_id, status_message_id,
+                   status, created_at, finished_at
+            FROM broadcast_jobs WHERE id = ?
+            """,
+            (job_id,)
+        )
+        return BroadcastJob.from_row(row) if row else None
+    
+    async def get_unfinished_jobs(self) -> list[BroadcastJob]:
+        rows = await self.db.fetchall(
+            """
+            SELECT id, text, reply_markup, title, status_chat_id, status_message_id,
+                   status, created_at, finished_at
+            FROM broadcast_jobs WHERE status = ? ORDER BY id ASC
+            """,
+            (BroadcastJobStatus.RUNNING.value,)
+        )
+        return [BroadcastJob.from_row(row) for row in rows]
+    
+    async def release_claimed(self, job_id: int) -> int:
+        """Return deliveries claimed by a previous run back to pending"""
+        cursor = await self.db.execute(
+            "UPDATE broadcast_deliveries SET status = ? WHERE job_id = ? AND status = ?",
+            (DeliveryStatus.PENDING.value, job_id, DeliveryStatus.SENDING.value)
+        )
+        await self.db.commit()
+        return cursor.rowcount
+    
+    async def claim_batch(self, job_id: int, limit: int) -> list[BroadcastDelivery]:
+        """Take the next pending deliveries of a job and mark them as in flight"""
+        cursor = await self.db.execute(
+            """
+            SELECT id, job_id, user_id, telegram_id, mark_confirmation
+            FROM broadcast_deliveries
+            WHERE job_id = ? AND status = ?
+            ORDER BY id ASC
+            LIMIT ?
+            """,
+            (job_id, DeliveryStatus.PENDING.value, limit)
+        )
+        rows = await cursor.fetchall()
+        deliveries = [BroadcastDelivery.from_row(row) for row in rows]
+        if deliveries:
+            await self.db.executemany(
+                "UPDATE broadcast_deliveries SET status = ? WHERE id = ?",
+                [(DeliveryStatus.SENDING.value, delivery.id) for delivery in deliveries]
+            )
+            await self.db.commit()
+        return deliveries
+    
+    async def mark_sent(self, results: list[tuple[BroadcastDelivery, int]]) -> None:
+        """Record (delivery, attempts) pairs that were delivered"""
+        if not results:
+            return
+        now = datetime.now().isoformat()
+        await self.db.executemany(
+            """
+            UPDATE broadcast_deliveries
+            SET status = ?, attempts = ?, error = NULL, updated_at = ?
+            WHERE id = ?
+            """,
+            [
+                (DeliveryStatus.SENT.value, attempts, now, delivery.id)
+                for delivery, attempts in results
+            ]
+        )
+        # Same commit as the deliveries, a crash can't leave the flag behind
+        await self.db.executemany(
+            "UPDATE users SET confirmation_sent = 1 WHERE id = ?",
+            [(delivery.user_id,) for delivery, _ in results if delivery.mark_confirmation]
+        )
+        await self.db.commit()
+    
+    async def mark_failed(self, results: list[tuple[BroadcastDelivery, int, str, bool]]) -> None:
+        """Record (delivery, attempts, error, unreachable) tuples that couldn't be delivered.
+
+        Unreachable users are left out of future broadcasts.
+        """
+        if not results:
+            return
+        now = datetime.now().isoformat()
+        await self.db.executemany(
+            """
+            UPDATE broadcast_deliveries
+            SET status = ?, attempts = ?, error = ?, updated_at = ?
+            WHERE id = ?
+            """,
+            [
+                (DeliveryStatus.FAILED.value, attempts, error, now, delivery.id)
+                for delivery, attempts, error, _ in results
+            ]
+        )
+        await self.db.executemany(
+            """
+            UPDATE users
+            SET is_reachable = CASE WHEN ? THEN 0 ELSE is_reachable END,
+                last_delivery_error_at = ?
+            WHERE id = ?
+            """,
+            [
+                (int(unreachable), now, delivery.user_id)
+                for delivery, _, _, unreachable in results
+            ]
+        )
+        await self.db.commit()
+    
+    async def finish_job(self, job_id: int) -> None:
+        await self.db.execute(
+            "UPDATE broadcast_jobs SET status = ?, finished_at = ? WHERE id = ?",
+            (BroadcastJobStatus.DONE.value, datetime.now().isoformat(), job_id)
+        )
+        await self.db.commit()
+    
+    async def get_stats(self, job_id: int) -> BroadcastStats:
+        rows = await self.db.fetchall(
+            """
+            SELECT status, mark_confirmation, COUNT(*)
+            FROM broadcast_deliveries
+            WHERE job_id = ?
+            GROUP BY status, mark_confirmation
+            """,
+            (job_id,)
+        )
+        stats = BroadcastStats()
+        for status, mark_confirmation, count in rows:
+            if status == DeliveryStatus.SENT.value:
+                stats.sent += count
+                if mark_confirmation:
+                    stats.sent_new += count
+            elif status == DeliveryStatus.FAILED.value:
+                stats.failed += count
+            else:
+                stats.pending += count
+        return stats
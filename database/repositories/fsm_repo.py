@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from database.database import Database
+
+
+class FSMRepository:
+    """Rows behind the aiogram FSM storage, one per storage key"""
+    
+    def __init__(self, db: Database):
+        self.db = db
+    
+    async def get(self, key: str) -> Optional[tuple[Optional[str], dict[str, Any]]]:
+        row = await self.db.fetchone(
+            "SELECT state, data FROM fsm_states WHERE key = ?", (key,)
+        )
+        if not row:
+            return None
+        return row[0], json.loads(row[1])
+    
+    async def save_many(self, records: list[tuple[str, int, Optional[str], dict[str, Any]]]) -> None:
+        """Upsert (key, chat_id, state, data) records in one transaction"""
+        if not records:
+            return
+        now = datetime.now().isoformat()
+        await self.db.executemany(
+            """
+            INSERT INTO fsm_states (key, chat_id, state, data, updated_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                chat_id = excluded.chat_id,
+                state = excluded.state,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            [
+                (key, chat_id, state, json.dumps(data, ensure_ascii=False), now)
+                for key, chat_id, state, data in records
+            ]
+        )
+        await self.db.commit()
+    
+    async def delete_idle(self, idle_ttl: float, shard: Optional[tuple[int, int]] = None) -> list[str]:
+        """Delete rows not written for idle_ttl seconds, returns their keys.
+
+        With shard=(index, count) only rows of chats with chat_id % count == index
+        are touched, rows saved before chat_id was stored belong to shard 0.
+        """
+        cutoff = (datetime.now() - timedelta(seconds=idle_ttl)).isoformat()
+        if shard is None:
+            cursor = await self.db.execute(
+                "DELETE FROM fsm_states WHERE updated_at < ? RETURNING key", (cutoff,)
+            )
+        else:
+            index, count = shard
+            # SQLite's % keeps the sign, group chat ids are negative
+            cursor = await self.db.execute(
+                """
+                DELETE FROM fsm_states
+                WHERE updated_at < ? AND (COALESCE(chat_id, 0) % ? + ?) % ? = ?
+                RETURNING key
+                """,
+                (cutoff, count, count, count, index)
+            )
+        keys = [row[0] for row in await cursor.fetchall()]
+        await self.db.commit()
+        return keys
+    
+    async def count_by_state(self) -> dict[str, int]:
+        rows = await self.db.fetchall(
+            "SELECT state, COUNT(*) FROM fsm_states WHERE state IS NOT NULL GROUP BY state"
+        )
+        return {state: count for state, count in rows}
+    
+    async def delete_many(self, keys: list[str]) -> None:
+        if not keys:
+            return
+        await self.db.executemany(
+            "DELETE FROM fsm_states WHERE key = ?", [(key,) for key in keys]
+        )
+        await self.db.commit()
@@ -1,14 +1,46 @@
+import time
+from dataclasses import replace
+from typing import Optional
+
 from database.database import Database
 from database.models import BotSettings
 
 
 class SettingsRepository:
-    def __init__(self, db: Database):
+    """bot_settings with an in-process copy.
+
+    Writes go through this class and update the copy right after commit.
+    Changes made by another connection (sqlite3 CLI, a second process) are
+    noticed via PRAGMA data_version, checked at most every refresh_interval
+    seconds, so the user hot path normally doesn't touch the database.
+    """
+    
+    def __init__(self, db: Database, refresh_interval: float = 5.0):
         self.db = db
+        self.refresh_interval = refresh_interval
+        self._cached: Optional[BotSettings] = None
+        self._data_version: Optional[int] = None
+        self._checked_at = 0.0
+        db.add_transaction_listener(self._drop_cache)
     
 
     async def get(self) -> BotSettings:
-        cursor = await self.db.connection.execute(
+        if self._cached and time.monotonic() - self._checked_at < self.refresh_interval:
+            return self._cached
+        data_version = await self._get_data_version()
+        if not self._cached or data_version != self._data_version:
+            self._cached = await self._load()
+            self._data_version = data_version
+        self._checked_at = time.monotonic()
+        return self._cached
+    
+
+    def _drop_cache(self) -> None:
+        self._cached = None
+    
+
+    async def _load(self) -> BotSettings:
+        cursor = await self.db.execute(
             "SELECT registration_open, max_registrations FROM bot_settings WHERE id = 1"
         )
         row = await cursor.fetchone()
@@ -17,20 +49,32 @@ class SettingsRepository:
         return BotSettings()
     
 
+    async def _get_data_version(self) -> int:
+        # Only changes when another connection commits, our own writes keep it
+        cursor = await self.db.execute("PRAGMA data_version")
+        row = await cursor.fetchone()
+        return row[0]
+    
+
     async def set_registration_open(self, is_open: bool) -> None:
-        await self.db.connection.execute(
+        await self.db.execute(
             "UPDATE bot_settings SET registration_open = ? WHERE id = 1",
             (int(is_open),)
         )
-        await self.db.connection.commit()
+        await self.db.commit()
+        if self._cached:
+            # A new object, readers holding the old one never see a half update
+            self._cached = replace(self._cached, registration_open=is_open)
     
 
     async def set_max_registrations(self, max_reg: int) -> None:
-        await self.db.connection.execute(
+        await self.db.execute(
             "UPDATE bot_settings SET max_registrations = ? WHERE id = 1",
             (max_reg,)
         )
-        await self.db.connection.commit()
+        await self.db.commit()
+        if self._cached:
+            self._cached = replace(self._cached, max_registrations=max_reg)
     
 
     async def is_registration_open(self) -> bool:
@@ -41,4 +85,3 @@ class SettingsRepository:
     async def get_max_registrations(self) -> int:
         settings = await self.get()
         return settings.max_registrations
-
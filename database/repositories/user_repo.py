@@ -1,12 +1,52 @@
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
+from database.cache import LRUCache
 from database.database import Database
-from database.models import User, UserStatus
+from database.models import Recipient, User, UserStatus
 
 
 class UserRepository:
-    def __init__(self, db: Database):
+    """Users table access.
+
+    get_by_telegram_id is served from a telegram_id -> User cache and a
+    cache of ids known not to be registered. Every write in this class
+    updates or drops the affected entries, writes from elsewhere are
+    picked up once cache_ttl runs out.
+    """
+    
+    def __init__(self, db: Database, cache_size: int = 10000, cache_ttl: float = 300.0):
         self.db = db
+        self._users: LRUCache[int, User] = LRUCache(cache_size, cache_ttl)
+        self._missing: LRUCache[int, bool] = LRUCache(cache_size, cache_ttl)
+        # Bumped by every write, a read that raced with one doesn't fill the cache
+        self._generation = 0
+        db.add_transaction_listener(self._clear_cache)
+    
+    def _remember(self, user: Optional[User]) -> Optional[User]:
+        self._generation += 1
+        if user:
+            self._users.put(user.telegram_id, user)
+            self._missing.pop(user.telegram_id)
+        return user
+    
+    def _clear_cache(self) -> None:
+        self._generation += 1
+        self._users.clear()
+        self._missing.clear()
+    
+    def forget(self, user_ids: list[int]) -> None:
+        """Drop cached users, for changes made through other repositories"""
+        if not user_ids:
+            return
+        self._generation += 1
+        ids = set(user_ids)
+        self._users.remove_if(lambda user: user.id in ids)
+    
+    @staticmethod
+    async def _fetch_returned(cursor) -> Optional[tuple]:
+        # A RETURNING statement is only finished once all its rows are read
+        rows = await cursor.fetchall()
+        return rows[0] if rows else None
     
     async def create(
         self,
@@ -22,12 +62,13 @@ class UserRepository:
         source: str,
         status: UserStatus = UserStatus.REGISTERED
     ) -> User:
-        cursor = await self.db.connection.execute(
+        cursor = await self.db.execute(
             """
             INSERT INTO users (
                 telegram_id, username, full_name, study_group, course,
                 vk_link, tg_link, phone, faculty, source, status, created_at
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING *
             """,
             (
                 telegram_id, username, full_name, study_group, course,
@@ -35,87 +76,293 @@ class UserRepository:
                 datetime.now().isoformat()
             )
         )
-        await self.db.connection.commit()
-        
-        return await self.get_by_telegram_id(telegram_id)
+        row = await self._fetch_returned(cursor)
+        await self.db.commit()
+        return self._remember(User.from_row(row))
+    
+    async def register_with_capacity(
+        self,
+        telegram_id: int,
+        username: Optional[str],
+        full_name: str,
+        study_group: str,
+        course: int,
+        vk_link: str,
+        tg_link: str,
+        phone: str,
+        faculty: str,
+        source: str
+    ) -> User:
+        """Create user as REGISTERED while seats are left, otherwise as RESERVE.
+
+        The capacity check and the insert are one statement, and SQLite runs
+        a write statement under the database write lock, so concurrent
+        registrations can't take more seats than max_registrations.
+        """
+        cursor = await self.db.execute(
+            """
+            INSERT INTO users (
+                telegram_id, username, full_name, study_group, course,
+                vk_link, tg_link, phone, faculty, source, status, created_at
+            ) VALUES (
+                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                COALESCE((
+                    SELECT CASE
+                        WHEN s.max_registrations > 0
+                             AND COALESCE(c.count, 0) >= s.max_registrations
+                        THEN ? ELSE ?
+                    END
+                    FROM bot_settings s
+                    LEFT JOIN status_counters c ON c.status = ?
+                    WHERE s.id = 1
+                ), ?),
+                ?
+            )
+            RETURNING *
+            """,
+            (
+                telegram_id, username, full_name, study_group, course,
+                vk_link, tg_link, phone, faculty, source,
+                UserStatus.RESERVE.value, UserStatus.REGISTERED.value,
+                UserStatus.REGISTERED.value, UserStatus.REGISTERED.value,
+                datetime.now().isoformat()
+            )
+        )
+        row = await self._fetch_returned(cursor)
+        await self.db.commit()
+        return self._remember(User.from_row(row))
     
     async def get_by_id(self, user_id: int) -> Optional[User]:
-        cursor = await self.db.connection.execute(
+        row = await self.db.fetchone(
             "SELECT * FROM users WHERE id = ?", (user_id,)
         )
-        row = await cursor.fetchone()
         return User.from_row(row) if row else None
     
     async def get_by_telegram_id(self, telegram_id: int) -> Optional[User]:
-        cursor = await self.db.connection.execute(
+        user = self._users.get(telegram_id)
+        if user or self._missing.get(telegram_id):
+            return user
+        generation = self._generation
+        row = await self.db.fetchone(
             "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
         )
-        row = await cursor.fetchone()
-        return User.from_row(row) if row else None
+        user = User.from_row(row) if row else None
+        if generation == self._generation:
+            if user:
+                self._users.put(telegram_id, user)
+            else:
+                self._missing.put(telegram_id, True)
+        return user
     
     async def get_all(self, status: Optional[UserStatus] = None) -> list[User]:
         if status:
-            cursor = await self.db.connection.execute(
+            rows = await self.db.fetchall(
                 "SELECT * FROM users WHERE status = ? ORDER BY created_at ASC",
                 (status.value,)
             )
         else:
-            cursor = await self.db.connection.execute(
+            rows = await self.db.fetchall(
                 "SELECT * FROM users ORDER BY created_at ASC"
             )
-        rows = await cursor.fetchall()
         return [User.from_row(row) for row in rows]
     
+    @staticmethod
+    def _filters(
+        status: UserStatus | tuple[UserStatus, ...] | None,
+        confirmation_sent: Optional[bool],
+        include_unreachable: bool
+    ) -> tuple[list[str], list]:
+        conditions = []
+        params: list = []
+        if status:
+            statuses = status if isinstance(status, tuple) else (status,)
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params += [s.value for s in statuses]
+        if confirmation_sent is not None:
+            conditions.append("confirmation_sent = ?")
+            params.append(int(confirmation_sent))
+        if not include_unreachable:
+            conditions.append("is_reachable = 1")
+        return conditions, params
+    
+    async def _iter_rows(
+        self,
+        columns: str,
+        conditions: list[str],
+        params: list,
+        batch_size: int
+    ) -> AsyncIterator[tuple]:
+        """Yield rows of columns page by page, keyset on (created_at, id).
+
+        Memory stays flat and every page is an index range scan whatever
+        the table size.
+        """
+        last_key: tuple[str, int] = ("", 0)
+        while True:
+            where = " AND ".join(conditions + ["(created_at, id) > (?, ?)"])
+            rows = await self.db.fetchall(
+                f"SELECT {columns}, created_at, id FROM users WHERE {where} "
+                f"ORDER BY created_at ASC, id ASC LIMIT ?",
+                (*params, *last_key, batch_size)
+            )
+            for row in rows:
+                yield row[:-2]
+            if len(rows) < batch_size:
+                return
+            last_key = rows[-1][-2:]
+    
+    async def iter_users(
+        self,
+        status: UserStatus | tuple[UserStatus, ...] | None = None,
+        batch_size: int = 500,
+        confirmation_sent: Optional[bool] = None,
+        include_unreachable: bool = True
+    ) -> AsyncIterator[User]:
+        """Stream users in registration order, batch_size rows per query"""
+        conditions, params = self._filters(status, confirmation_sent, include_unreachable)
+        async for row in self._iter_rows("*", conditions, params, batch_size):
+            yield User.from_row(row)
+    
+    async def iter_recipients(
+        self,
+        status: UserStatus | tuple[UserStatus, ...] | None = None,
+        batch_size: int = 1000,
+        confirmation_sent: Optional[bool] = None,
+        include_unreachable: bool = False
+    ) -> AsyncIterator[Recipient]:
+        """Like iter_users, but reads only the columns a broadcast needs"""
+        conditions, params = self._filters(status, confirmation_sent, include_unreachable)
+        async for row in self._iter_rows(
+            "id, telegram_id, confirmation_sent", conditions, params, batch_size
+        ):
+            yield Recipient(row[0], row[1], bool(row[2]))
+    
+    async def count_users(
+        self,
+        status: UserStatus | tuple[UserStatus, ...] | None = None,
+        confirmation_sent: Optional[bool] = None,
+        include_unreachable: bool = True
+    ) -> int:
+        """Count users matching the same filters as iter_users"""
+        conditions, params = self._filters(status, confirmation_sent, include_unreachable)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        row = await self.db.fetchone(
+            f"SELECT COUNT(*) FROM users {where}", params
+        )
+        return row[0] if row else 0
+    
     async def get_registered_count(self) -> int:
         """Get count of users who are registered (not in reserve)"""
-        cursor = await self.db.connection.execute(
-            "SELECT COUNT(*) FROM users WHERE status = ?",
+        row = await self.db.fetchone(
+            "SELECT count FROM status_counters WHERE status = ?",
             (UserStatus.REGISTERED.value,)
         )
-        row = await cursor.fetchone()
         return row[0] if row else 0
     
     async def get_total_count(self) -> int:
         """Get total count of all users"""
-        cursor = await self.db.connection.execute("SELECT COUNT(*) FROM users")
-        row = await cursor.fetchone()
+        row = await self.db.fetchone("SELECT SUM(count) FROM status_counters")
+        return row[0] or 0 if row else 0
+    
+    async def count_by_status(self) -> dict[UserStatus, int]:
+        """Get count of users for every status.
+
+        Counters are kept exact by triggers on users, so this never scans the table.
+        """
+        rows = await self.db.fetchall("SELECT status, count FROM status_counters")
+        counts = {status: 0 for status in UserStatus}
+        for status, count in rows:
+            counts[UserStatus(status)] = count
+        return counts
+    
+    async def get_unreachable_count(self) -> int:
+        """Get count of users skipped by broadcasts because their chat is unreachable"""
+        row = await self.db.fetchone(
+            "SELECT COUNT(*) FROM users WHERE is_reachable = 0"
+        )
         return row[0] if row else 0
     
-    async def update_status(self, user_id: int, status: UserStatus) -> None:
-        await self.db.connection.execute(
-            "UPDATE users SET status = ? WHERE id = ?",
+    async def update_status(self, user_id: int, status: UserStatus) -> Optional[User]:
+        cursor = await self.db.execute(
+            "UPDATE users SET status = ? WHERE id = ? RETURNING *",
             (status.value, user_id)
         )
-        await self.db.connection.commit()
+        row = await self._fetch_returned(cursor)
+        await self.db.commit()
+        return self._remember(User.from_row(row) if row else None)
     
-    async def update_confirmation_sent(self, user_id: int, sent: bool = True) -> None:
-        await self.db.connection.execute(
-            "UPDATE users SET confirmation_sent = ? WHERE id = ?",
-            (int(sent), user_id)
+    async def _move_status(self, source: UserStatus, target: UserStatus, limit: int, offset: int) -> list[int]:
+        cursor = await self.db.execute(
+            """
+            UPDATE users SET status = ?
+            WHERE id IN (
+                SELECT id FROM users
+                WHERE status = ?
+                ORDER BY created_at ASC, id ASC
+                LIMIT ? OFFSET ?
+            )
+            RETURNING telegram_id
+            """,
+            (target.value, source.value, limit, offset)
         )
-        await self.db.connection.commit()
+        telegram_ids = [row[0] for row in await cursor.fetchall()]
+        await self.db.commit()
+        self._generation += 1
+        for telegram_id in telegram_ids:
+            self._users.pop(telegram_id)
+        return telegram_ids
+    
+    async def demote_beyond_limit(self, limit: int) -> list[int]:
+        """Move registered users past the first limit to the reserve, returns their telegram ids"""
+        return await self._move_status(UserStatus.REGISTERED, UserStatus.RESERVE, -1, limit)
+    
+    async def promote_from_reserve(self, count: int) -> list[int]:
+        """Register the count earliest reserve users, returns their telegram ids"""
+        return await self._move_status(UserStatus.RESERVE, UserStatus.REGISTERED, count, 0)
+    
+    async def mark_reachable(self, telegram_id: int) -> None:
+        """User wrote to the bot again, so the chat works"""
+        await self.db.execute(
+            "UPDATE users SET is_reachable = 1 WHERE telegram_id = ?",
+            (telegram_id,)
+        )
+        await self.db.commit()
+        self._generation += 1
+        self._users.pop(telegram_id)
     
     async def delete(self, user_id: int) -> Optional[User]:
-        user = await self.get_by_id(user_id)
-        if user:
-            await self.db.connection.execute(
-                "DELETE FROM users WHERE id = ?", (user_id,)
-            )
-            await self.db.connection.commit()
+        cursor = await self.db.execute(
+            "DELETE FROM users WHERE id = ? RETURNING *", (user_id,)
+        )
+        row = await self._fetch_returned(cursor)
+        # Even a DELETE that matched nothing has opened a write transaction
+        await self.db.commit()
+        if not row:
+            return None
+        user = User.from_row(row)
+        self._generation += 1
+        self._users.pop(user.telegram_id)
+        self._missing.put(user.telegram_id, True)
         return user
     
     async def delete_by_telegram_id(self, telegram_id: int) -> Optional[User]:
-        user = await self.get_by_telegram_id(telegram_id)
-        if user:
-            await self.db.connection.execute(
-                "DELETE FROM users WHERE telegram_id = ?", (telegram_id,)
-            )
-            await self.db.connection.commit()
+        cursor = await self.db.execute(
+            "DELETE FROM users WHERE telegram_id = ? RETURNING *", (telegram_id,)
+        )
+        row = await self._fetch_returned(cursor)
+        # Even a DELETE that matched nothing has opened a write transaction
+        await self.db.commit()
+        if not row:
+            return None
+        user = User.from_row(row)
+        self._generation += 1
+        self._users.pop(user.telegram_id)
+        self._missing.put(user.telegram_id, True)
         return user
     
     async def get_first_reserve(self) -> Optional[User]:
         """Get the first user in reserve (earliest registration)"""
-        cursor = await self.db.connection.execute(
+        row = await self.db.fetchone(
             """
             SELECT * FROM users 
             WHERE status = ? 
@@ -124,38 +371,11 @@ class UserRepository:
             """,
             (UserStatus.RESERVE.value,)
         )
-        row = await cursor.fetchone()
         return User.from_row(row) if row else None
     
-    async def get_users_for_confirmation(self) -> list[User]:
-        """Get users who haven't received confirmation request yet"""
-        cursor = await self.db.connection.execute(
-            """
-            SELECT * FROM users 
-            WHERE status IN (?, ?) AND confirmation_sent = 0
-            ORDER BY created_at ASC
-            """,
-            (UserStatus.REGISTERED.value, UserStatus.RESERVE.value)
-        )
-        rows = await cursor.fetchall()
-        return [User.from_row(row) for row in rows]
-    
-    async def get_users_without_response(self) -> list[User]:
-        """Get users who received confirmation but haven't responded (not CONFIRMED or DECLINED)"""
-        cursor = await self.db.connection.execute(
-            """
-            SELECT * FROM users 
-            WHERE status IN (?, ?) AND confirmation_sent = 1
-            ORDER BY created_at ASC
-            """,
-            (UserStatus.REGISTERED.value, UserStatus.RESERVE.value)
-        )
-        rows = await cursor.fetchall()
-        return [User.from_row(row) for row in rows]
-    
     async def reset_confirmation_sent_for_non_responded(self) -> int:
         """Reset confirmation_sent flag for users who haven't responded"""
-        cursor = await self.db.connection.execute(
+        cursor = await self.db.execute(
             """
             UPDATE users 
             SET confirmation_sent = 0 
@@ -163,24 +383,6 @@ class UserRepository:
             """,
             (UserStatus.REGISTERED.value, UserStatus.RESERVE.value)
         )
-        await self.db.connection.commit()
+        await self.db.commit()
+        self._clear_cache()
         return cursor.rowcount
-    
-    async def get_confirmed_users(self) -> list[User]:
-        """Get users who confirmed attendance"""
-        cursor = await self.db.connection.execute(
-            "SELECT * FROM users WHERE status = ? ORDER BY created_at ASC",
-            (UserStatus.CONFIRMED.value,)
-        )
-        rows = await cursor.fetchall()
-        return [User.from_row(row) for row in rows]
-    
-    async def get_declined_users(self) -> list[User]:
-        """Get users who declined attendance"""
-        cursor = await self.db.connection.execute(
-            "SELECT * FROM users WHERE status = ? ORDER BY created_at ASC",
-            (UserStatus.DECLINED.value,)
-        )
-        rows = await cursor.fetchall()
-        return [User.from_row(row) for row in rows]
-
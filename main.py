@@ -1,15 +1,23 @@
 import asyncio
 import logging
+import signal
+from multiprocessing.queues import Queue
+from typing import Optional
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from config import load_config
+from cluster import ShardRouter, consume_updates, start_workers, stop_workers, watch_workers
+from config import Config, WebhookConfig, load_config
 from database import Database
-from database.repositories import UserRepository, SettingsRepository
+from database.repositories import UserRepository, SettingsRepository, BroadcastRepository, FSMRepository
 from bot.handlers import get_all_routers
+from bot.scheduler import UpdateScheduler
+from bot.storage import SQLiteStorage
 from services.google_sheets import GoogleSheetsService
+from services.broadcast import BroadcastService
 
 
 logging.basicConfig(
@@ -18,22 +26,87 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+WEBHOOK_SHUTDOWN_TIMEOUT = 60.0
 
-async def main():
 
-    config = load_config()
+async def run_polling(bot: Bot, dp: Dispatcher) -> None:
+    await bot.delete_webhook(drop_pending_updates=True)
+    await dp.start_polling(bot)
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, webhook: WebhookConfig) -> None:
+    """Serve updates on a local aiohttp server until SIGINT/SIGTERM.
+
+    The webhook is left registered on exit, so Telegram keeps updates that
+    arrive during a restart and delivers them to the next run. An update is
+    acknowledged only once it has been handled, so the ones cut off by a
+    shutdown are delivered again too. In multi-process mode handling on
+    this side means queueing it to a worker, see ShardRouter.
+    """
+    app = web.Application()
+    # Before the handler's own hook closing the bot session, so dispatcher
+    # shutdown handlers can still call the API
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=webhook.secret
+    ).register(app, path=webhook.path)
     
-    if not config.bot.token:
-        logger.error("BOT_TOKEN is not set!")
-        return
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        site = web.TCPSite(runner, webhook.host, webhook.port)
+        await site.start()
+        # Only now the server can take what Telegram has queued for us
+        await bot.set_webhook(
+            url=webhook.url + webhook.path,
+            secret_token=webhook.secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=False
+        )
+        logger.info("Webhook server on %s:%s%s", webhook.host, webhook.port, webhook.path)
+        
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+    finally:
+        for site in list(runner.sites):
+            await site.stop()
+        # aiohttp runs on_shutdown before waiting for requests, let the updates
+        # being handled finish while the bot and the database are still open
+        await runner.server.shutdown(WEBHOOK_SHUTDOWN_TIMEOUT)
+        await runner.cleanup()
 
-    db = Database(config.db.path)
+
+async def build(config: Config, worker_index: Optional[int] = None) -> tuple[Database, Bot, Dispatcher, BroadcastService]:
+    """Create everything a process handling updates needs"""
+    db = Database(
+        config.db.path,
+        group_commit=config.db.group_commit,
+        commit_window=config.db.commit_window,
+        pragmas=config.db.pragmas,
+        read_pool_size=config.db.read_pool_size
+    )
     await db.connect()
     logger.info("Database connected")
     
 
-    user_repo = UserRepository(db)
+    user_repo = UserRepository(
+        db,
+        cache_size=config.db.user_cache_size,
+        # Other workers change users too, only their own writes are seen right away
+        cache_ttl=(
+            config.db.user_cache_ttl if worker_index is None
+            else min(config.db.user_cache_ttl, config.cluster.worker_cache_ttl)
+        )
+    )
     settings_repo = SettingsRepository(db)
+    broadcast_repo = BroadcastRepository(db)
+    fsm_repo = FSMRepository(db)
     
  
     sheets_service = GoogleSheetsService(
@@ -46,7 +119,38 @@ async def main():
         token=config.bot.token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    # Closed by the dispatcher on shutdown, which writes out the last FSM changes
+    storage = SQLiteStorage(
+        fsm_repo,
+        flush_interval=config.fsm.flush_interval,
+        idle_ttl=config.fsm.idle_ttl,
+        sweep_interval=config.fsm.sweep_interval,
+        # Rows of chats sharded to other workers may be alive in their memory
+        shard=(worker_index, config.cluster.workers) if worker_index is not None else None
+    )
+    dp = Dispatcher(storage=storage)
+    # Per-chat ordering, parallelism across chats and load shedding for every update
+    UpdateScheduler(
+        max_concurrency=config.updates.max_concurrency,
+        max_pending=config.updates.max_pending
+    ).setup(dp)
+
+    broadcast_service = BroadcastService(
+        bot,
+        broadcast_repo,
+        user_repo,
+        workers=config.broadcast.workers,
+        rate=config.broadcast.rate,
+        per_chat_interval=config.broadcast.per_chat_interval,
+        max_retries=config.broadcast.max_retries,
+        retry_backoff=config.broadcast.retry_backoff,
+        retry_backoff_max=config.broadcast.retry_backoff_max,
+        progress_interval=config.broadcast.progress_interval,
+        flush_size=config.broadcast.flush_size,
+        run_jobs=worker_index in (None, 0)
+    )
+    # Jobs stop while the bot session is still open, polling and webhook alike
+    dp.shutdown.register(broadcast_service.shutdown)
     
 
     for router in get_all_routers():
@@ -54,20 +158,115 @@ async def main():
     
 
     dp["config"] = config
+    dp["db"] = db
     dp["user_repo"] = user_repo
     dp["settings_repo"] = settings_repo
     dp["sheets_service"] = sheets_service
-    
+    dp["broadcast_service"] = broadcast_service
+    return db, bot, dp, broadcast_service
+
+
+async def run_updates(bot: Bot, dp: Dispatcher, config: Config) -> None:
+    if config.webhook.enabled:
+        await run_webhook(bot, dp, config.webhook)
+    else:
+        await run_polling(bot, dp)
+
+
+async def run_single(config: Config) -> None:
+    db, bot, dp, broadcast_service = await build(config)
     try:
         logger.info("Bot starting...")
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        # Broadcasts interrupted by the previous shutdown continue in background
+        await broadcast_service.resume_jobs()
+        await run_updates(bot, dp, config)
     finally:
+        await broadcast_service.shutdown()
         await db.disconnect()
         await bot.session.close()
         logger.info("Bot stopped")
 
 
+async def run_front(config: Config) -> None:
+    """Receive updates and shard them by chat to config.cluster.workers processes"""
+    # Migrate once here rather than in every worker at the same time
+    db = Database(config.db.path, pragmas=config.db.pragmas)
+    await db.connect()
+    await db.disconnect()
+    
+    processes, queues = start_workers(config.cluster.workers, run_worker_process)
+    bot = Bot(token=config.bot.token)
+    dp = Dispatcher(disable_fsm=True)
+    # Routers are only attached so polling asks Telegram for the update types they use
+    for router in get_all_routers():
+        dp.include_router(router)
+    dp.update.outer_middleware(ShardRouter(queues))
+    watchdog = asyncio.create_task(watch_workers(processes, queues, run_worker_process))
+    updates = asyncio.create_task(run_updates(bot, dp, config))
+    try:
+        logger.info("Bot starting with %s workers...", config.cluster.workers)
+        await asyncio.wait((watchdog, updates), return_when=asyncio.FIRST_COMPLETED)
+        if watchdog.done():
+            # Nobody would answer that share of chats, exit with an error so the service is restarted
+            raise RuntimeError("A bot worker process keeps failing")
+        await updates
+    finally:
+        for task in (watchdog, updates):
+            task.cancel()
+        await asyncio.gather(watchdog, updates, return_exceptions=True)
+        await stop_workers(processes, queues)
+        await bot.session.close()
+        logger.info("Bot stopped")
+
+
+async def run_worker(index: int, queue: Queue) -> None:
+    config = load_config()
+    db, bot, dp, broadcast_service = await build(config, worker_index=index)
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    watcher = None
+    try:
+        logger.info("Worker %s started", index)
+        if index == 0:
+            # The only worker sending broadcasts, the others just create the jobs
+            watcher = asyncio.create_task(
+                broadcast_service.watch_jobs(config.cluster.broadcast_poll_interval)
+            )
+        await consume_updates(queue, bot, dp)
+    finally:
+        if watcher:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await broadcast_service.shutdown()
+        await db.disconnect()
+        await bot.session.close()
+        logger.info("Worker %s stopped", index)
+
+
+def run_worker_process(index: int, queue: Queue) -> None:
+    # Ctrl+C and service managers signal the whole group, workers stop when the front tells them
+    # so the FSM changes and broadcast progress still get written
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_IGN)
+    asyncio.run(run_worker(index, queue))
+
+
+async def main():
+
+    config = load_config()
+    
+    if not config.bot.token:
+        logger.error("BOT_TOKEN is not set!")
+        return
+    if config.webhook.enabled and not (config.webhook.url and config.webhook.secret):
+        logger.error("WEBHOOK_URL and WEBHOOK_SECRET must be set in webhook mode!")
+        return
+
+    if config.cluster.workers > 1:
+        await run_front(config)
+    else:
+        await run_single(config)
+
+
 if __name__ == "__main__":
     asyncio.run(main())
-
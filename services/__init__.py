@@ -1,4 +1,4 @@
 from .google_sheets import GoogleSheetsService
+from .broadcast import BroadcastService
 
-__all__ = ["GoogleSheetsService"]
-
+__all__ = ["GoogleSheetsService", "BroadcastService"]
@@ -0,0 +1,427 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterable, AsyncIterator, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import InlineKeyboardMarkup, Message
+
+from bot.keyboards.admin_kb import AdminKeyboards
+from database.models import Recipient, BroadcastJob, BroadcastDelivery, BroadcastStats
+from database.repositories import BroadcastRepository, UserRepository
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError)
+
+
+def is_unreachable(error: Exception) -> bool:
+    """Bot blocked, account deleted or chat gone, retrying later won't help"""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and "chat not found" in error.message.lower()
+
+
+class TokenBucket:
+    """Global send limiter shared by all broadcast workers"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens, e.g. while Telegram asks us to retry after"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        # The lock keeps waiters in FIFO order while one of them sleeps for a token
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatLimiter:
+    """Minimal interval between two messages to the same chat"""
+
+    PRUNE_THRESHOLD = 10_000
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_allowed: dict[int, float] = {}
+
+    async def acquire(self, chat_id: int) -> None:
+        now = time.monotonic()
+        if len(self._next_allowed) > self.PRUNE_THRESHOLD:
+            self._next_allowed = {
+                cid: ts for cid, ts in self._next_allowed.items() if ts > now
+            }
+        ready_at = max(now, self._next_allowed.get(chat_id, 0.0))
+        self._next_allowed[chat_id] = ready_at + self.interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+
+class BroadcastService:
+    '''Рассылки идут через пул воркеров, скорость ограничена лимитами Telegram'''
+
+    FLUSH_INTERVAL = 2.0
+
+    def __init__(
+        self,
+        bot: Bot,
+        broadcast_repo: BroadcastRepository,
+        user_repo: UserRepository,
+        workers: int = 10,
+        rate: float = 25.0,
+        per_chat_interval: float = 1.0,
+        max_retries: int = 5,
+        retry_backoff: float = 1.0,
+        retry_backoff_max: float = 30.0,
+        batch_size: int = 100,
+        progress_interval: float = 5.0,
+        flush_size: int = 50,
+        run_jobs: bool = True
+    ):
+        self.bot = bot
+        self.broadcast_repo = broadcast_repo
+        self.user_repo = user_repo
+        self.workers = workers
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.flush_size = flush_size
+        # Telegram limits the whole bot, with several processes only one of them sends
+        self.run_jobs = run_jobs
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.limiter = TokenBucket(rate)
+        self.chat_limiter = ChatLimiter(per_chat_interval)
+        self._tasks: dict[int, asyncio.Task] = {}
+        # Left for the next start, as without watch_jobs
+        self._failed: set[int] = set()
+
+    async def send(
+        self,
+        chat_id: int,
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ) -> None:
+        await self.chat_limiter.acquire(chat_id)
+        await self.limiter.acquire()
+        await self.bot.send_message(
+            chat_id,
+            text,
+            reply_markup=reply_markup,
+            parse_mode="HTML"
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.retry_backoff * 2 ** attempt, self.retry_backoff_max)
+
+    async def create_job(
+        self,
+        recipients: AsyncIterable[Recipient],
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+        mark_confirmation: bool = False,
+        title: str = "Рассылка",
+        status_message: Optional[Message] = None
+    ) -> int:
+        """Persist a broadcast to every recipient the iterable yields.
+
+        With mark_confirmation users that haven't got the confirmation
+        request yet get confirmation_sent on delivery. Progress of the job
+        is reported by editing status_message.
+        """
+        job_id = await self.broadcast_repo.create_job(
+            text,
+            reply_markup.model_dump_json(exclude_none=True) if reply_markup else None,
+            title,
+            status_message.chat.id if status_message else None,
+            status_message.message_id if status_message else None
+        )
+        batch: list[tuple[int, int, bool]] = []
+        async for recipient in recipients:
+            batch.append((
+                recipient.id,
+                recipient.telegram_id,
+                mark_confirmation and not recipient.confirmation_sent
+            ))
+            if len(batch) >= self.batch_size:
+                await self.broadcast_repo.add_deliveries(job_id, batch)
+                batch = []
+        await self.broadcast_repo.add_deliveries(job_id, batch)
+        await self.broadcast_repo.start_job(job_id)
+        return job_id
+
+    def spawn(self, job_id: int) -> Optional[asyncio.Task]:
+        """Run the job in background so the handler can return right away.
+
+        Without run_jobs the job is left to the process that watches for them.
+        """
+        if not self.run_jobs:
+            return None
+        task = self._tasks.get(job_id)
+        if task and not task.done():
+            return task
+        task = asyncio.create_task(self._run_with_progress(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return task
+
+    async def shutdown(self) -> None:
+        """Stop running jobs, they stay unfinished and get resumed on next start"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run_job(self, job_id: int) -> BroadcastStats:
+        """Deliver every pending recipient of the job, safe to call again after a restart"""
+        job = await self.broadcast_repo.get_job(job_id)
+        if not job:
+            raise ValueError(f"Broadcast job {job_id} not found")
+
+        reply_markup = (
+            InlineKeyboardMarkup.model_validate_json(job.reply_markup)
+            if job.reply_markup else None
+        )
+        await self.broadcast_repo.release_claimed(job_id)
+
+        async def claimed() -> AsyncIterator[BroadcastDelivery]:
+            while batch := await self.broadcast_repo.claim_batch(job_id, self.batch_size):
+                for delivery in batch:
+                    yield delivery
+
+        await self._deliver(claimed(), job.text, reply_markup)
+        await self.broadcast_repo.finish_job(job_id)
+        return await self.broadcast_repo.get_stats(job_id)
+
+    async def resume_jobs(self) -> None:
+        """Spawn broadcasts interrupted by a restart"""
+        for job in await self.broadcast_repo.get_unfinished_jobs():
+            if job.id not in self._tasks and job.id not in self._failed:
+                logger.info("Resuming broadcast job %s", job.id)
+                self.spawn(job.id)
+
+    async def watch_jobs(self, interval: float) -> None:
+        """Keep spawning unfinished jobs, including ones other processes created"""
+        while True:
+            try:
+                await self.resume_jobs()
+            except Exception:
+                logger.exception("Failed to look for broadcast jobs")
+            await asyncio.sleep(interval)
+
+    async def _run_with_progress(self, job_id: int) -> None:
+        job = await self.broadcast_repo.get_job(job_id)
+        if not job:
+            logger.error("Broadcast job %s not found", job_id)
+            return
+
+        reporter = asyncio.create_task(self._report_progress(job))
+        try:
+            stats = await self.run_job(job_id)
+        except Exception:
+            logger.exception("Broadcast job %s failed", job_id)
+            self._failed.add(job_id)
+            return
+        finally:
+            reporter.cancel()
+
+        logger.info("Broadcast job %s done: sent %s, failed %s", job_id, stats.sent, stats.failed)
+        await self._edit_status(
+            job,
+            _format_done(job, stats),
+            reply_markup=AdminKeyboards.get_back_button()
+        )
+
+    async def _report_progress(self, job: BroadcastJob) -> None:
+        if job.status_chat_id is None:
+            return
+
+        started = time.monotonic()
+        initial = await self.broadcast_repo.get_stats(job.id)
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            stats = await self.broadcast_repo.get_stats(job.id)
+            processed = stats.sent + stats.failed - initial.sent - initial.failed
+            rate = processed / (time.monotonic() - started)
+            await self._edit_status(job, _format_progress(job.title, stats, rate))
+
+    async def _edit_status(
+        self,
+        job: BroadcastJob,
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ) -> None:
+        if job.status_chat_id is None:
+            return
+        try:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=job.status_chat_id,
+                message_id=job.status_message_id,
+                reply_markup=reply_markup,
+                parse_mode="HTML"
+            )
+        except Exception as e:
+            # Message deleted or not modified, progress is not worth failing the job
+            logger.debug("Can't update status of broadcast job %s: %s", job.id, e)
+
+    async def _deliver(
+        self,
+        deliveries: AsyncIterator[BroadcastDelivery],
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ) -> None:
+        """Send one message per delivery and record the outcome of each one.
+
+        Flood control and transient network errors put the recipient back
+        in the queue, only users that are really unreachable end up failed.
+        Outcomes are written in chunks of flush_size, so after a crash at most
+        one chunk of deliveries is sent again.
+        """
+        queue: asyncio.Queue[tuple[BroadcastDelivery, int]] = asyncio.Queue(maxsize=self.workers * 2)
+        retries: set[asyncio.Task] = set()
+        sent: list[tuple[BroadcastDelivery, int]] = []
+        failed: list[tuple[BroadcastDelivery, int, Exception]] = []
+
+        async def flush() -> None:
+            # Swap buffers before the first await so workers keep appending to fresh lists
+            nonlocal sent, failed
+            sent_chunk, failed_chunk = sent, failed
+            sent, failed = [], []
+            await self.broadcast_repo.mark_sent(sent_chunk)
+            await self.broadcast_repo.mark_failed([
+                (delivery, attempts, str(error), is_unreachable(error))
+                for delivery, attempts, error in failed_chunk
+            ])
+            # Both also changed users behind the user repository's back
+            self.user_repo.forget(
+                [delivery.user_id for delivery, _ in sent_chunk if delivery.mark_confirmation]
+                + [delivery.user_id for delivery, _, _ in failed_chunk]
+            )
+
+        async def flush_periodically() -> None:
+            # Slow jobs still persist their progress regularly
+            while True:
+                await asyncio.sleep(self.FLUSH_INTERVAL)
+                await flush()
+
+        async def requeue(delivery: BroadcastDelivery, attempt: int, delay: float) -> None:
+            await asyncio.sleep(delay)
+            await queue.put((delivery, attempt))
+            # Only now the previous attempt is done, so join() can't return early
+            queue.task_done()
+
+        def schedule_retry(delivery: BroadcastDelivery, attempt: int, delay: float) -> bool:
+            if attempt > self.max_retries:
+                return False
+            task = asyncio.create_task(requeue(delivery, attempt, delay))
+            retries.add(task)
+            task.add_done_callback(retries.discard)
+            return True
+
+        async def produce() -> None:
+            async for delivery in deliveries:
+                await queue.put((delivery, 0))
+
+        async def work() -> None:
+            while True:
+                delivery, attempt = await queue.get()
+                try:
+                    await self.send(delivery.telegram_id, text, reply_markup)
+                except TelegramRetryAfter as e:
+                    self.limiter.pause(e.retry_after)
+                    if schedule_retry(delivery, attempt + 1, e.retry_after):
+                        continue
+                    failed.append((delivery, attempt + 1, e))
+                except TRANSIENT_ERRORS as e:
+                    if schedule_retry(delivery, attempt + 1, self._backoff(attempt)):
+                        continue
+                    logger.warning("Giving up on %s after %d attempts: %s", delivery.telegram_id, attempt + 1, e)
+                    failed.append((delivery, attempt + 1, e))
+                except Exception as e:
+                    failed.append((delivery, attempt + 1, e))
+                else:
+                    sent.append((delivery, attempt + 1))
+                if len(sent) + len(failed) >= self.flush_size:
+                    await flush()
+                queue.task_done()
+
+        async def drain() -> None:
+            await produce()
+            await queue.join()
+
+        workers = [asyncio.create_task(work()) for _ in range(self.workers)]
+        drainer = asyncio.create_task(drain())
+        flusher = asyncio.create_task(flush_periodically())
+        try:
+            await asyncio.wait([drainer, flusher, *workers], return_when=asyncio.FIRST_COMPLETED)
+            # Workers and flusher never return on their own, so anything but the drainer is a crash
+            for task in [flusher, *workers]:
+                if task.done():
+                    task.result()
+            drainer.result()
+        finally:
+            for task in [drainer, flusher, *workers, *retries]:
+                task.cancel()
+            # Also on cancellation: what was already sent must not be sent again
+            await flush()
+
+
+def _format_progress(title: str, stats: BroadcastStats, rate: float) -> str:
+    if rate > 0:
+        eta_seconds = int(stats.pending / rate)
+        eta = f"{eta_seconds // 60} мин {eta_seconds % 60} с"
+    else:
+        eta = "—"
+    return (
+        f"📤 <b>{title}</b>\n\n"
+        f"✅ Отправлено: {stats.sent}\n"
+        f"❌ Ошибок: {stats.failed}\n"
+        f"⏳ Осталось: {stats.pending}\n"
+        f"⚡ Скорость: {rate:.1f} сообщ./с\n"
+        f"🕒 Примерно до конца: {eta}"
+    )
+
+
+def _format_done(job: BroadcastJob, stats: BroadcastStats) -> str:
+    text = f"✅ <b>{job.title} завершена</b>\n\n"
+    # Split is only meaningful when the job mixed new and already notified users
+    if 0 < stats.sent_new < stats.sent:
+        text += (
+            f"🆕 Новым отправлено: {stats.sent_new}\n"
+            f"⏳ Не ответили отправлено: {stats.sent - stats.sent_new}\n"
+        )
+    text += (
+        f"✅ Отправлено: {stats.sent}\n"
+        f"❌ Ошибок: {stats.failed}"
+    )
+    if job.reply_markup and stats.sent_new < stats.sent:
+        text += (
+            "\n\n💡 <b>Важно:</b> Если у пользователя несколько активных опросников, "
+            "ответ засчитается только один раз."
+        )
+    return text
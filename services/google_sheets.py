@@ -1,6 +1,6 @@
 import gspread
 from google.oauth2.service_account import Credentials
-from typing import Optional
+from typing import AsyncIterable, AsyncIterator, Optional
 from database.models import User
 
 
@@ -12,6 +12,9 @@ class GoogleSheetsService:
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive"
     ]
+
+    # Rows per values update, so an export never holds the whole table
+    EXPORT_CHUNK_SIZE = 500
     
 
     def __init__(self, credentials_file: str, spreadsheet_id: str):
@@ -47,8 +50,31 @@ class GoogleSheetsService:
         return worksheet
     
 
-    async def export_registrations(self, users: list[User]) -> None:
-        """Export all registrations to the main sheet"""
+    def _write_chunk(self, worksheet: gspread.Worksheet, rows: list[list], first_row: int) -> None:
+        last_row = first_row + len(rows) - 1
+        if worksheet.row_count < last_row:
+            worksheet.add_rows(last_row - worksheet.row_count)
+        worksheet.update(rows, f"A{first_row}")
+    
+
+    async def _write_rows(self, worksheet: gspread.Worksheet, rows: AsyncIterable[list], first_row: int) -> int:
+        """Write rows starting at first_row, EXPORT_CHUNK_SIZE per request, returns how many"""
+        chunk: list[list] = []
+        written = 0
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.EXPORT_CHUNK_SIZE:
+                self._write_chunk(worksheet, chunk, first_row + written)
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            self._write_chunk(worksheet, chunk, first_row + written)
+            written += len(chunk)
+        return written
+    
+
+    async def export_registrations(self, users: AsyncIterable[User]) -> int:
+        """Export all registrations to the main sheet, returns the number of rows"""
         worksheet = self._get_or_create_worksheet("Регистрации")
         
 
@@ -60,11 +86,11 @@ class GoogleSheetsService:
             "Курс", "Факультет", "ВКонтакте", "Telegram",
             "Телефон", "Источник", "Статус", "Дата регистрации"
         ]
+        worksheet.update([headers], "A1")
         
 
-        data = [headers]
-        for user in users:
-            data.append([
+        rows = (
+            [
                 user.id,
                 user.telegram_id,
                 user.username or "",
@@ -78,53 +104,55 @@ class GoogleSheetsService:
                 user.source,
                 user.status.value,
                 user.created_at.strftime("%Y-%m-%d %H:%M:%S")
-            ])
+            ]
+            async for user in users
+        )
+        count = await self._write_rows(worksheet, rows, 2)
 
 
-        worksheet.update(data, "A1")
         worksheet.format("A1:M1", {
             "backgroundColor": {"red": 0.2, "green": 0.4, "blue": 0.8},
             "textFormat": {"bold": True, "foregroundColor": {"red": 1, "green": 1, "blue": 1}},
             "horizontalAlignment": "CENTER"
         })
+        return count
+    
+
+    @staticmethod
+    async def _confirmation_rows(users: AsyncIterable[User], status: str) -> AsyncIterator[list]:
+        async for user in users:
+            yield [
+                user.full_name,
+                user.study_group,
+                user.course,
+                user.faculty,
+                user.phone,
+                status
+            ]
     
 
     async def export_confirmations(
         self,
-        confirmed: list[User],
-        declined: list[User] 
-    ) -> None:
-        
+        confirmed: AsyncIterable[User],
+        declined: AsyncIterable[User]
+    ) -> tuple[int, int]:
+        """Export confirmed and declined users, returns how many of each"""
 
         worksheet = self._get_or_create_worksheet("Подтверждения")
 
         worksheet.clear()
         headers = ["ФИО", "Группа", "Курс", "Факультет", "Телефон", "Статус"]
-        data = [headers]
+        worksheet.update([headers], "A1")
         
  
-        for user in confirmed:
-            data.append([
-                user.full_name,
-                user.study_group,
-                user.course,
-                user.faculty,
-                user.phone,
-                "✅ Придёт"
-            ])
+        confirmed_count = await self._write_rows(
+            worksheet, self._confirmation_rows(confirmed, "✅ Придёт"), 2
+        )
         
 
-        for user in declined:
-            data.append([
-                user.full_name,
-                user.study_group,
-                user.course,
-                user.faculty,
-                user.phone,
-                "❌ Не придёт"
-            ])
-
-        worksheet.update(data, "A1")
+        declined_count = await self._write_rows(
+            worksheet, self._confirmation_rows(declined, "❌ Не придёт"), 2 + confirmed_count
+        )
         
 
         worksheet.format("A1:F1", {
@@ -134,18 +162,18 @@ class GoogleSheetsService:
         })
 
 
-        if confirmed:
-            confirmed_range = f"A2:F{1 + len(confirmed)}"
+        if confirmed_count:
+            confirmed_range = f"A2:F{1 + confirmed_count}"
             worksheet.format(confirmed_range, {
                 "backgroundColor": {"red": 0.85, "green": 0.95, "blue": 0.85}
             })
         
 
-        if declined:
-            declined_start = 2 + len(confirmed)
-            declined_end = declined_start + len(declined) - 1
+        if declined_count:
+            declined_start = 2 + confirmed_count
+            declined_end = declined_start + declined_count - 1
             declined_range = f"A{declined_start}:F{declined_end}"
             worksheet.format(declined_range, {
                 "backgroundColor": {"red": 0.95, "green": 0.85, "blue": 0.85}
             })
-
+        return confirmed_count, declined_count
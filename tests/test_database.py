@@ -0,0 +1,98 @@
+import asyncio
+import sqlite3
+
+from database import Database
+from database.models import UserStatus
+from database.repositories import SettingsRepository, UserRepository
+
+
+def create_user(user_repo: UserRepository, telegram_id: int, status: UserStatus = UserStatus.REGISTERED):
+    return user_repo.create(
+        telegram_id, None, "Иван Иванов", "ГР-1", 1,
+        "https://vk.com/id1", "@user", "+70000000000", "ФЭБ", "Друзья", status
+    )
+
+
+def test_transaction_rolls_back_every_step(tmp_path):
+    path = str(tmp_path / "bot.db")
+
+    async def run():
+        db = Database(path, group_commit=True, pragmas={"journal_mode": "WAL"}, read_pool_size=2)
+        await db.connect()
+        try:
+            user_repo = UserRepository(db)
+            settings_repo = SettingsRepository(db)
+            reserve = await create_user(user_repo, 1, UserStatus.RESERVE)
+
+            started = asyncio.Event()
+
+            async def other_handler():
+                await started.wait()
+                # Writes of another task wait for the transaction and survive its rollback
+                await create_user(user_repo, 3)
+
+            other = asyncio.create_task(other_handler())
+            try:
+                async with db.transaction():
+                    await settings_repo.set_max_registrations(10)
+                    await user_repo.update_status(reserve.id, UserStatus.REGISTERED)
+                    await create_user(user_repo, 2)
+                    started.set()
+                    await asyncio.sleep(0.05)
+                    raise RuntimeError("step failed")
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError("transaction() swallowed the error")
+            await other
+
+            # Caches must not keep what the rolled back transaction wrote
+            return (
+                await settings_repo.get_max_registrations(),
+                await user_repo.get_by_telegram_id(1),
+                await user_repo.get_by_telegram_id(2),
+                await user_repo.get_by_telegram_id(3),
+                await user_repo.count_by_status(),
+                db.connection.in_transaction
+            )
+        finally:
+            await db.disconnect()
+
+    max_registrations, first, second, third, counts, open_transaction = asyncio.run(run())
+    assert max_registrations == 0
+    assert first.status == UserStatus.RESERVE
+    assert second is None
+    assert third is not None
+    assert counts[UserStatus.REGISTERED] == 1
+    assert counts[UserStatus.RESERVE] == 1
+    assert not open_transaction
+
+    with sqlite3.connect(path, timeout=0.1) as connection:
+        rows = connection.execute("SELECT telegram_id, status FROM users ORDER BY telegram_id").fetchall()
+    assert rows == [(1, UserStatus.RESERVE.value), (3, UserStatus.REGISTERED.value)]
+
+
+def test_failed_write_releases_database_lock(tmp_path):
+    path = str(tmp_path / "bot.db")
+
+    async def run():
+        db = Database(path, pragmas={"journal_mode": "WAL"})
+        await db.connect()
+        try:
+            user_repo = UserRepository(db)
+            await create_user(user_repo, 1)
+            try:
+                await create_user(user_repo, 1)
+            except sqlite3.IntegrityError:
+                pass
+            else:
+                raise AssertionError("duplicate telegram_id was inserted")
+            # Another process must be able to write right away
+            with sqlite3.connect(path, timeout=0.1) as connection:
+                connection.execute("UPDATE bot_settings SET max_registrations = 5")
+            connection.close()
+            return db.connection.in_transaction
+        finally:
+            await db.disconnect()
+
+    assert not asyncio.run(run())
@@ -0,0 +1,109 @@
+import asyncio
+import sqlite3
+
+from database import Database
+from database.migrations import MIGRATIONS
+from database.models import UserStatus
+from database.repositories import SettingsRepository, UserRepository
+
+# Schema the bot created before versioned migrations
+BASELINE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id INTEGER UNIQUE NOT NULL,
+        username TEXT,
+        full_name TEXT NOT NULL,
+        study_group TEXT NOT NULL,
+        course INTEGER NOT NULL,
+        vk_link TEXT NOT NULL,
+        tg_link TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        faculty TEXT NOT NULL,
+        source TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'registered',
+        created_at TEXT NOT NULL,
+        confirmation_sent INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS bot_settings (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        registration_open INTEGER NOT NULL DEFAULT 1,
+        max_registrations INTEGER NOT NULL DEFAULT 0
+    );
+
+    INSERT OR IGNORE INTO bot_settings (id, registration_open, max_registrations)
+    VALUES (1, 1, 0);
+"""
+
+BASELINE_USERS = [
+    (100, "first", "registered", "2024-09-01T10:00:00", 1),
+    (200, None, "reserve", "2024-09-01T11:00:00", 0),
+    (300, "third", "confirmed", "2024-09-01T12:00:00", 1),
+    (400, "fourth", "declined", "2024-09-01T13:00:00", 1),
+    (500, "fifth", "registered", "2024-09-01T14:00:00", 0),
+]
+
+
+def create_baseline_file(path: str) -> None:
+    with sqlite3.connect(path) as connection:
+        connection.executescript(BASELINE_SCHEMA)
+        connection.execute("UPDATE bot_settings SET registration_open = 0, max_registrations = 2")
+        connection.executemany(
+            """
+            INSERT INTO users (
+                telegram_id, username, full_name, study_group, course, vk_link,
+                tg_link, phone, faculty, source, status, created_at, confirmation_sent
+            ) VALUES (?, ?, 'Иван Иванов', 'ГР-1', 2, 'vk', 'tg', '+7', 'ФЭБ', 'Друзья', ?, ?, ?)
+            """,
+            BASELINE_USERS
+        )
+    connection.close()
+
+
+def test_baseline_file_migrates_to_latest_version(tmp_path):
+    path = str(tmp_path / "bot.db")
+    create_baseline_file(path)
+
+    async def run():
+        db = Database(path)
+        await db.connect()
+        try:
+            user_repo = UserRepository(db)
+            settings = await SettingsRepository(db).get()
+            users = [user async for user in user_repo.iter_users()]
+            counts = await user_repo.count_by_status()
+        finally:
+            await db.disconnect()
+        # A second start must find nothing left to do
+        db = Database(path)
+        await db.connect()
+        await db.disconnect()
+        return settings, users, counts
+
+    settings, users, counts = asyncio.run(run())
+
+    assert not settings.registration_open
+    assert settings.max_registrations == 2
+    assert [
+        (user.telegram_id, user.username, user.status.value, user.created_at.isoformat(), user.confirmation_sent)
+        for user in sorted(users, key=lambda user: user.telegram_id)
+    ] == [
+        (telegram_id, username, status, created_at, bool(sent))
+        for telegram_id, username, status, created_at, sent in BASELINE_USERS
+    ]
+    assert all(user.is_reachable and user.last_delivery_error_at is None for user in users)
+    assert counts == {
+        UserStatus.REGISTERED: 2,
+        UserStatus.RESERVE: 1,
+        UserStatus.CONFIRMED: 1,
+        UserStatus.DECLINED: 1,
+    }
+
+    with sqlite3.connect(path) as connection:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        indexes = {row[1] for row in connection.execute("PRAGMA index_list(users)")}
+    connection.close()
+    assert version == MIGRATIONS[-1].version
+    assert {"broadcast_jobs", "broadcast_deliveries", "status_counters", "fsm_states"} <= tables
+    assert {"idx_users_status_created", "idx_users_status_confirmation_created"} <= indexes
@@ -0,0 +1,88 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, Update
+
+from bot.scheduler import UpdateScheduler
+from bot.storage import SQLiteStorage
+from database import Database
+from database.repositories import FSMRepository
+
+
+class Steps(StatesGroup):
+    second = State()
+
+
+def message_update(update_id: int, chat_id: int = 1) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+            "text": f"m{update_id}"
+        }
+    })
+
+
+def test_next_update_of_chat_sees_state_set_by_previous():
+    handled = []
+
+    async def run():
+        bot = Bot("123:abc")
+        dp = Dispatcher()
+        UpdateScheduler().setup(dp)
+        router = Router()
+
+        @router.message(StateFilter(None))
+        async def first(message: Message, state: FSMContext):
+            await asyncio.sleep(0.1)
+            await state.set_state(Steps.second)
+            handled.append(("first", message.text))
+
+        @router.message(Steps.second)
+        async def second(message: Message):
+            handled.append(("second", message.text))
+
+        dp.include_router(router)
+        await asyncio.gather(
+            dp.feed_update(bot, message_update(1)),
+            dp.feed_update(bot, message_update(2))
+        )
+        await bot.session.close()
+
+    asyncio.run(run())
+    assert handled == [("first", "m1"), ("second", "m2")]
+
+
+def test_updates_of_chat_keep_order_with_sqlite_storage(tmp_path):
+    handled: dict[int, list[str]] = {}
+
+    async def run():
+        db = Database(str(tmp_path / "bot.db"), pragmas={"journal_mode": "WAL"}, read_pool_size=4)
+        await db.connect()
+        bot = Bot("123:abc")
+        # New chats, so every first state read goes to the database through the pool
+        dp = Dispatcher(storage=SQLiteStorage(FSMRepository(db)))
+        UpdateScheduler(max_concurrency=50, max_pending=10000).setup(dp)
+        router = Router()
+
+        @router.message()
+        async def record(message: Message):
+            handled.setdefault(message.chat.id, []).append(message.text)
+
+        dp.include_router(router)
+        updates = [message_update(chat_id * 3 + n, chat_id) for chat_id in range(1, 301) for n in range(3)]
+        await asyncio.gather(*(dp.feed_update(bot, update) for update in updates))
+        await dp.storage.close()
+        await db.disconnect()
+        await bot.session.close()
+
+    asyncio.run(run())
+    assert len(handled) == 300
+    for chat_id, texts in handled.items():
+        assert texts == [f"m{chat_id * 3 + n}" for n in range(3)]
@@ -0,0 +1,39 @@
+import asyncio
+
+from database import Database
+from database.models import UserStatus
+from database.repositories import SettingsRepository, UserRepository
+
+
+def register(user_repo: UserRepository, telegram_id: int):
+    return user_repo.register_with_capacity(
+        telegram_id, None, "Иван Иванов", "ГР-1", 1,
+        "https://vk.com/id1", "@user", "+70000000000", "ФЭБ", "Друзья"
+    )
+
+
+def test_concurrent_registrations_never_exceed_limit(tmp_path):
+    async def run():
+        db = Database(
+            str(tmp_path / "bot.db"),
+            group_commit=True,
+            pragmas={"journal_mode": "WAL"},
+            read_pool_size=4
+        )
+        await db.connect()
+        try:
+            await SettingsRepository(db).set_max_registrations(50)
+            user_repo = UserRepository(db)
+            users = await asyncio.gather(*(register(user_repo, 1000 + i) for i in range(300)))
+            counts = await user_repo.count_by_status()
+            rows = await db.fetchall("SELECT status, COUNT(*) FROM users GROUP BY status")
+            return users, counts, dict(rows)
+        finally:
+            await db.disconnect()
+
+    users, counts, rows = asyncio.run(run())
+    assert sum(user.status == UserStatus.REGISTERED for user in users) == 50
+    assert sum(user.status == UserStatus.RESERVE for user in users) == 250
+    assert counts[UserStatus.REGISTERED] == 50
+    assert counts[UserStatus.RESERVE] == 250
+    assert rows == {UserStatus.REGISTERED.value: 50, UserStatus.RESERVE.value: 250}